@@ -1,15 +1,21 @@
 import os
-from lib.load import preflight, load_vosk_model
+from lib.load import preflight
 
 preflight()
-load_vosk_model()
 
 from flask import Flask
-from db.models import db, User, Action, Macro, MacroAction, UserAction
+from db.models import db, pool_stats, User, UserSettings, Action, Macro, MacroAction, UserAction, Place
 from services.routes.users import users_bp
 from services.routes.macros import macros_bp
 from services.routes.actions import actions_bp
 from services.routes.pipelines import pipeline_bp
+from services.routes.stats import stats_bp
+from services.routes.health import health_bp
+from services.routes.pipelines import processor_singleton, transcription_pool
+from lib.startup import Startup
+from lib.speech import get_speech_backend
+from lib import conversions, stats, tracing
+from globals import constants
 from flask_cors import CORS
 
 app = Flask(__name__)
@@ -18,14 +24,52 @@ CORS(app, origins=[os.getenv("CLIENT_URL", "http://localhost:3000")], supports_c
 def init_db():
     """Initialize the database and create tables if they don't exist."""
     with db:
-        db.create_tables([User, Action, Macro, MacroAction, UserAction])
+        db.create_tables([User, UserSettings, Action, Macro, MacroAction, UserAction, Place], safe=True)
+
+# every request checks a connection out of the pool and hands it back when done
+@app.before_request
+def open_db_connection():
+    db.connect(reuse_if_open=True)
+
+@app.teardown_request
+def close_db_connection(exc):
+    if not db.is_closed():
+        db.close()
+
+# stage timings of the request, optionally reported back in a Server-Timing header
+@app.before_request
+def start_trace():
+    tracing.start_trace()
+
+@app.after_request
+def add_server_timing(response):
+    trace = tracing.current_trace.get()
+    if constants.server_timing and trace:
+        response.headers['Server-Timing'] = tracing.server_timing(trace)
+    return response
+
+stats.register("database", pool_stats)
 
 # register route blueprints
 app.register_blueprint(users_bp)
 app.register_blueprint(macros_bp)
 app.register_blueprint(actions_bp)
 app.register_blueprint(pipeline_bp)
+app.register_blueprint(stats_bp)
+app.register_blueprint(health_bp)
 
-if __name__ == '__main__':
+# load the models and clients before serving, while serving /healthz (background) or on first use (lazy)
+startup = Startup()
+startup.register("vosk_model", conversions.get_model) # downloads it when missing
+startup.register("transcription_workers", transcription_pool.warm)
+startup.register("llm_client", lambda: processor_singleton.client)
+startup.register("speech_backend", get_speech_backend)
+
+# transcription workers are spawned and re-import the main script (python app.py), they only need the worker code
+if __name__ != '__mp_main__':
+    # on import, so gunicorn (app:app) and asgi.py also add tables introduced since the database was created
     init_db()
+    startup.start()
+
+if __name__ == '__main__':
     app.run(port=2512, debug=True)
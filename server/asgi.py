@@ -0,0 +1,105 @@
+# uvicorn asgi:app --port 2512
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from app import app as flask_app
+from db.models import User, with_connection
+from lib import conversions, tracing
+from lib.async_processor import AsyncProcessor, async_actions
+from lib.transcription import TranscriptionPool, TranscriptionQueueFull
+from lib.jobs import JobQueue, JobQueueFull
+from globals import constants
+
+processor_singleton = AsyncProcessor() # initialize the AsyncProcessor class (singleton)
+transcription_pool = TranscriptionPool() # initialize the TranscriptionPool class (singleton)
+job_queue = JobQueue() # initialize the JobQueue class (singleton)
+
+async def get_user_from_header(request: Request) -> User:
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        raise HTTPException(401, 'Missing X-User-ID')
+    try:
+        return await asyncio.to_thread(with_connection(User.get), User.id == uuid.UUID(user_id))
+    except Exception:
+        raise HTTPException(401, 'Invalid User ID')
+
+async def response_pipeline(request: Request):
+    """Async /respond: many conversations can wait on the llm and actions concurrently in one process."""
+    trace = tracing.start_trace()
+    user = await get_user_from_header(request)
+
+    # ----------------------------- transcribe audio ----------------------------- #
+
+    form = await request.form()
+    file = form.get('file')
+
+    if file is None or isinstance(file, str):
+        return JSONResponse({'error': 'No file part'}, status_code=400)
+
+    if file.filename == '':
+        return JSONResponse({'error': 'No selected file'}, status_code=400)
+
+    # job mode -> a job worker responds, the client polls /respond/jobs/<id>
+    if request.query_params.get('mode', constants.respond_mode) == 'job':
+        try:
+            job_id = await asyncio.to_thread(job_queue.enqueue, user, await file.read())
+        except JobQueueFull as e:
+            return JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': str(constants.job_long_poll_max)})
+        status_url = f'/respond/jobs/{job_id}'
+        return JSONResponse({'id': job_id, 'status': 'queued', 'status_url': status_url}, status_code=202, headers={'Location': status_url})
+
+    try:
+        with tracing.span("decode"):
+            pcm, sample_rate = await asyncio.to_thread(conversions.normalize_audio, await file.read())
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        future = await asyncio.to_thread(transcription_pool.submit, pcm, sample_rate)
+    except TranscriptionQueueFull as e:
+        return JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': str(constants.transcription_queue_timeout)})
+
+    with tracing.span("transcribe"):
+        transcription, _ = await asyncio.wrap_future(future)
+
+    # ------------------------- process message with llm ------------------------- #
+
+    response, actions_performed = await processor_singleton.handle_message(user, transcription)
+
+    # -------------------- convert back to audio and send back ------------------- #
+
+    headers = {'Server-Timing': tracing.server_timing(trace)} if constants.server_timing else None
+    return StreamingResponse(iterate_in_threadpool(conversions.text_to_audio(response)), media_type=conversions.audio_mimetype(), headers=headers)
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    yield
+    await async_actions.aclose()
+
+# async routes take precedence, everything else is served by the flask app
+app = Starlette(
+    routes=[
+        Route('/respond', response_pipeline, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=[os.getenv("CLIENT_URL", "http://localhost:3000")],
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        ),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,32 @@
+# python -m bench.make_corpus
+"""Synthesize the benchmark's recorded commands (bench/corpus/*.wav) with espeak-ng, the engine of the local
+speech backend. The generated files are committed, so every run measures the same audio; rerun only to change the set."""
+import argparse
+import os
+import subprocess
+
+# file name -> spoken command, covering the llm-only path and each stubbed upstream (see bench/stubs.py)
+commands = {
+    "weather": "what is the weather in boise today",
+    "time": "what time is it",
+    "date": "what is the date today",
+    "stocks": "how are my stocks doing",
+    "crypto": "what is the price of bitcoin",
+    "joke": "tell me a short joke about computers",
+}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default="bench/corpus", help="directory to write the recordings (.wav) to")
+    parser.add_argument("--voice", default="en-us", help="espeak-ng voice")
+    args = parser.parse_args()
+
+    os.makedirs(args.corpus, exist_ok=True)
+    for name, text in commands.items():
+        path = os.path.join(args.corpus, f"{name}.wav")
+        # 16-bit mono PCM, which /respond passes to vosk without decoding through ffmpeg
+        subprocess.run(["espeak-ng", "-v", args.voice, "-w", path, text], check=True)
+        print(f"{path}: {text}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# python -m bench.run --concurrency 1,4,16 --requests 200
+"""Offline end-to-end benchmark of /respond: recorded commands go through the whole pipeline (decode, vosk,
+llm rounds, actions, tts) with every upstream replaced by a local stand-in (see bench/stubs.py)."""
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import argparse
+import contextvars
+import glob
+import json
+import math
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from bench import stubs
+
+type Sample = dict[str, float] # stage -> seconds spent in it by one request
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of the values."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def parse_latencies(overrides: list[str]) -> dict[str, float]:
+    latencies = dict(stubs.default_latencies)
+    for override in overrides:
+        name, _, seconds = override.partition("=")
+        if name not in stubs.stubs:
+            raise SystemExit(f"Unknown upstream '{name}', expected one of {', '.join(stubs.stubs)}.")
+        latencies[name] = float(seconds)
+    return latencies
+
+def configure(environment: dict[str, str], directory: str) -> None:
+    """Point the server at the stand-ins and at throwaway databases, before anything reads the constants."""
+    os.environ.update(environment)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{directory}/bench.db",
+        "JOB_DB_PATH": f"{directory}/jobs.db",
+        "SPEECH_CACHE_DIR": f"{directory}/speech-cache",
+        "CONVERSATION_DB_PATH": "",
+        "RESPOND_MODE": "inline",
+        "TTS_BACKEND": "elevenlabs",
+        "TTS_FALLBACK_BACKEND": "",
+        "SERVER_TIMING": "false",
+    })
+    for key in ("ANTHROPIC_API_KEY", "ADMIN_API_KEY", "OPEN_WEATHER_API_KEY", "ELEVEN_LABS_API_KEY", "APLHA_VANTAGE_KEY", "MARKET_STACK_API_KEY"):
+        os.environ[key] = "bench" # never send real keys, and satisfy preflight
+
+def respond(client, user_id: str, audio: bytes) -> tuple[int, Sample]:
+    """Send one recording to /respond and read the audio back, returning the status and the request's stage timings."""
+    from lib import tracing
+
+    def run() -> tuple[int, Sample]:
+        started_at = time.perf_counter()
+        response = client.post("/respond", headers={"X-User-ID": user_id}, data={"file": (BytesIO(audio), "command.wav")})
+
+        sample: Sample = {}
+        for chunk in response.iter_encoded():
+            if chunk and "first_audio" not in sample:
+                sample["first_audio"] = time.perf_counter() - started_at
+        response.close()
+        sample["total"] = time.perf_counter() - started_at
+
+        # the request's trace lives in this context, repeated stages (e.g. llm rounds) are summed
+        for stage, seconds in tracing.current_trace.get() or []:
+            sample[stage] = sample.get(stage, 0.0) + seconds
+        return response.status_code, sample
+
+    return contextvars.copy_context().run(run)
+
+def run_level(app, users: list[str], corpus: list[bytes], concurrency: int, requests: int) -> dict:
+    """Send the requests from concurrent clients, each client with its own user and conversation."""
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    samples: list[Sample] = []
+    errors = 0
+
+    def client_loop(user_id: str) -> None:
+        nonlocal errors
+        client = app.test_client()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            status, sample = respond(client, user_id, corpus[index % len(corpus)])
+            with lock:
+                if status == 200:
+                    samples.append(sample)
+                else:
+                    errors += 1
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client_loop, users[:concurrency]))
+    elapsed = time.perf_counter() - started_at
+
+    stages = sorted({stage for sample in samples for stage in sample}, key=lambda stage: (stage in ("first_audio", "total"), stage))
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "stages": {
+            stage: {
+                "count": len(values),
+                **{f"p{p}": percentile(values, p) for p in (50, 95, 99)},
+            }
+            for stage in stages
+            if (values := [sample[stage] for sample in samples if stage in sample])
+        },
+    }
+
+def measure_memory(app, user_id: str, corpus: list[bytes]) -> dict:
+    """Peak python allocations of single requests, one at a time (vosk runs in the transcription workers and is not included)."""
+    client = app.test_client()
+    peaks = []
+
+    tracemalloc.start()
+    for audio in corpus:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        respond(client, user_id, audio)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+
+    return {
+        "avg_peak_bytes": sum(peaks) / len(peaks),
+        "max_peak_bytes": max(peaks),
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, # kilobytes on linux
+    }
+
+def print_level(level: dict) -> None:
+    print(
+        f"\nconcurrency {level['concurrency']}: {level['requests']} requests in {level['seconds']:.1f}s, "
+        f"{level['throughput']:.2f} req/s, {level['errors']} errors"
+    )
+    print(f"  {'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, summary in level["stages"].items():
+        print(f"  {stage:<28}{summary['count']:>7}{summary['p50'] * 1000:>10.1f}{summary['p95'] * 1000:>10.1f}{summary['p99'] * 1000:>10.1f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default="bench/corpus", help="directory of recorded commands (.wav)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=1, help="passes over the corpus before measuring")
+    parser.add_argument("--latency", action="append", default=[], metavar="UPSTREAM=SECONDS",
+                        help=f"latency of a stand-in ({', '.join(stubs.stubs)}), may be repeated")
+    parser.add_argument("--json", help="also write the results to this file, e.g. to compare runs")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.corpus, "*.wav")))
+    if not paths:
+        raise SystemExit(f"No recordings found in {args.corpus}, add a few spoken commands as .wav files.")
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as file:
+            corpus.append(file.read())
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    latencies = parse_latencies(args.latency)
+
+    running, environment = stubs.start(latencies)
+    directory = tempfile.mkdtemp(prefix="hem-bench-")
+    configure(environment, directory)
+
+    # imported only now, the constants read the environment at import
+    from app import app # creates the tables
+    from db.models import User
+    from db.seed import seed_actions_from_registry
+    from lib import stats
+
+    seed_actions_from_registry()
+    users = [str(User.create().id) for _ in range(max(levels))]
+
+    print(f"{len(corpus)} recordings, upstream latencies: {', '.join(f'{name}={seconds}s' for name, seconds in latencies.items())}")
+    for _ in range(args.warmup):
+        for audio in corpus:
+            respond(app.test_client(), users[0], audio)
+
+    results = {"latencies": latencies, "levels": [], "memory": None, "upstream_requests": {}, "stats": {}}
+    for concurrency in levels:
+        level = run_level(app, users, corpus, concurrency, args.requests)
+        results["levels"].append(level)
+        print_level(level)
+
+    results["memory"] = measure_memory(app, users[0], corpus)
+    print(
+        f"\nmemory per request: {results['memory']['avg_peak_bytes'] / 1024:.0f} KiB avg, "
+        f"{results['memory']['max_peak_bytes'] / 1024:.0f} KiB max peak python allocations; "
+        f"process max rss {results['memory']['max_rss_bytes'] / 1024 / 1024:.0f} MiB"
+    )
+
+    results["upstream_requests"] = {name: stub.requests for name, stub in running.items()}
+    print(f"upstream requests: {', '.join(f'{name}={count}' for name, count in results['upstream_requests'].items())}")
+
+    # cache hit rates explain most differences between runs
+    collected = stats.collect()
+    results["stats"] = {name: collected[name] for name in ("speech_cache", "action_cache", "intents", "tool_selection") if name in collected}
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2, default=str)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable
+from urllib.parse import urlparse, parse_qs
+import itertools
+import json
+import random
+import threading
+import time
+
+type StubResponse = tuple[int, str, Iterable[bytes]] # status, content type, body chunks
+
+def json_response(payload: Any, status: int = 200) -> StubResponse:
+    return status, "application/json", [json.dumps(payload).encode()]
+
+class Stub:
+    """Stand-in for an upstream api, answering after a fixed latency."""
+    name = "base"
+    env = "" # environment variable pointing the server at the stand-in
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def respond(self, method: str, path: str, query: dict[str, list[str]], body: Any) -> StubResponse:
+        raise NotImplementedError
+
+    def handle(self, method: str, path: str, query: dict[str, list[str]], body: Any) -> StubResponse:
+        with self.lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        return self.respond(method, path, query, body)
+
+class AnthropicStub(Stub):
+    """Messages api: calls the tool a message asks for, then answers with the tool's result."""
+    name = "anthropic"
+    env = "ANTHROPIC_BASE_URL"
+
+    # the first matching tool is called when it was sent with the request
+    tool_calls = (
+        (("weather", "forecast", "temperature", "rain"), "get_weather", {"location": "Boise"}),
+        (("stock", "stocks", "shares", "ticker"), "get_stock_info", {"tickers": ["AAPL", "MSFT"]}),
+        (("crypto", "bitcoin", "coin"), "get_crypto_price", {"coin": "bitcoin", "currency": "usd"}),
+        (("time", "clock"), "get_time", {}),
+        (("date", "day"), "get_date", {}),
+    )
+
+    def __init__(self, latency: float) -> None:
+        super().__init__(latency)
+        self.ids = itertools.count()
+
+    @staticmethod
+    def _text(content: str | list) -> str:
+        if isinstance(content, str):
+            return content
+        return " ".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+    def _tool_call(self, text: str, tools: set[str]) -> dict | None:
+        words = set(text.lower().split())
+        for keywords, name, tool_input in AnthropicStub.tool_calls:
+            if name in tools and words.intersection(keywords):
+                return {"type": "tool_use", "id": f"toolu_bench_{next(self.ids)}", "name": name, "input": tool_input}
+        return None
+
+    def respond(self, method, path, query, body):
+        if path != "/v1/messages" or method != "POST":
+            return json_response({"type": "error", "error": {"type": "not_found_error", "message": path}}, 404)
+        if body.get("stream"):
+            return json_response({"type": "error", "error": {"type": "invalid_request_error", "message": "streaming is not stubbed"}}, 400)
+
+        last = body["messages"][-1]
+        results = [
+            block for block in last["content"] if isinstance(block, dict) and block.get("type") == "tool_result"
+        ] if isinstance(last["content"], list) else []
+
+        tools = set()
+        if body.get("tool_choice", {}).get("type") != "none":
+            tools = {tool["name"] for tool in body.get("tools", [])}
+
+        tool_call = None if results else self._tool_call(AnthropicStub._text(last["content"]), tools)
+        if tool_call:
+            content, stop_reason = [tool_call], "tool_use"
+        else:
+            found = " ".join(AnthropicStub._text(result.get("content", "")) for result in results)
+            text = f"Here is what I found. {found[:160]}" if found else "Sure, that is taken care of."
+            content, stop_reason = [{"type": "text", "text": text}], "end_turn"
+
+        return json_response({
+            "id": f"msg_bench_{next(self.ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", ""),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            # same ~4 characters per token estimate as the server
+            "usage": {"input_tokens": len(json.dumps(body)) // 4, "output_tokens": len(json.dumps(content)) // 4},
+        })
+
+class ElevenLabsStub(Stub):
+    """Text to speech: silent MP3 frames with a duration proportional to the text, streamed in chunks."""
+    name = "elevenlabs"
+    env = "ELEVEN_LABS_BASE_URL"
+
+    # MPEG-1 layer III, 128 kbps, 44.1 kHz, mono frame of silence (1152 samples)
+    frame = bytes([0xFF, 0xFB, 0x90, 0xC4]) + bytes(413)
+    frame_seconds = 1152 / 44100
+    seconds_per_char = 0.06
+    frames_per_chunk = 10
+
+    def respond(self, method, path, query, body):
+        if not path.startswith("/v1/text-to-speech/") or method != "POST":
+            return json_response({"detail": "Not Found"}, 404)
+
+        frame_count = max(1, round(len(body.get("text", "")) * ElevenLabsStub.seconds_per_char / ElevenLabsStub.frame_seconds))
+        chunks = [
+            ElevenLabsStub.frame * min(ElevenLabsStub.frames_per_chunk, frame_count - offset)
+            for offset in range(0, frame_count, ElevenLabsStub.frames_per_chunk)
+        ]
+        return 200, "audio/mpeg", chunks
+
+class OpenWeatherStub(Stub):
+    name = "openweather"
+    env = "OPEN_WEATHER_BASE_URL"
+
+    def respond(self, method, path, query, body):
+        temp = round(random.uniform(40, 90), 1)
+        return json_response({
+            "current": {"temp": temp, "weather": [{"description": "clear sky"}]},
+            "daily": [{"temp": {"min": temp - 10, "max": temp + 8}}],
+        })
+
+class NominatimStub(Stub):
+    name = "nominatim"
+    env = "NOMINATIM_BASE_URL"
+
+    def respond(self, method, path, query, body):
+        return json_response([{"lat": "43.6150", "lon": "-116.2023", "display_name": query.get("q", [""])[0]}])
+
+class MarketStackStub(Stub):
+    name = "marketstack"
+    env = "MARKET_STACK_BASE_URL"
+
+    def respond(self, method, path, query, body):
+        symbols = query.get("symbols", [""])[0].split(",")
+        return json_response({"data": [
+            {"symbol": symbol, "date": "2025-01-02T00:00:00+0000", "open": 100.0, "close": round(random.uniform(90, 110), 2), "volume": 1000000}
+            for symbol in symbols for _ in range(5)
+        ]})
+
+class CoingeckoStub(Stub):
+    name = "coingecko"
+    env = "COINGECKO_BASE_URL"
+
+    def respond(self, method, path, query, body):
+        coins = query.get("ids", [""])[0].split(",")
+        return json_response([
+            {"id": coin, "symbol": coin[:3], "current_price": round(random.uniform(1, 100000), 2), "market_cap": 1000000000}
+            for coin in coins
+        ])
+
+stubs: dict[str, type[Stub]] = {
+    stub.name: stub
+    for stub in (AnthropicStub, ElevenLabsStub, OpenWeatherStub, NominatimStub, MarketStackStub, CoingeckoStub)
+}
+
+default_latencies = { # seconds, roughly the upstreams' usual time to first byte
+    "anthropic": 0.6,
+    "elevenlabs": 0.25,
+    "openweather": 0.15,
+    "nominatim": 0.2,
+    "marketstack": 0.2,
+    "coingecko": 0.15,
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real apis
+    disable_nagle_algorithm = True # small writes would otherwise wait on delayed acks
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def _handle(self, method: str) -> None:
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        status, content_type, chunks = self.server.stub.handle(method, url.path, parse_qs(url.query), body)
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+def start(latencies: dict[str, float]) -> tuple[dict[str, Stub], dict[str, str]]:
+    """Serve every stand-in on a local port, returning the stubs and the environment pointing the server at them."""
+    running: dict[str, Stub] = {}
+    environment: dict[str, str] = {}
+
+    for name, stub_class in stubs.items():
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        server.daemon_threads = True
+        server.stub = stub_class(latencies.get(name, default_latencies[name]))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        running[name] = server.stub
+        environment[stub_class.env] = f"http://127.0.0.1:{server.server_port}"
+
+    return running, environment
@@ -1,9 +1,59 @@
+from contextlib import contextmanager
+from functools import wraps
 from playhouse.db_url import connect
-from peewee import Model, CharField, TextField, BooleanField, ForeignKeyField, UUIDField
+from peewee import Model, CharField, TextField, BooleanField, ForeignKeyField, UUIDField, FloatField, IntegerField
 import os
 from uuid import uuid4
+from globals import constants
 
-db = connect(os.getenv("DATABASE_URL", "sqlite:///hem.db"))
+def pooled_url(url: str) -> str:
+    """Switch a database url to its pooled scheme (e.g. sqlite:// -> sqlite+pool://)."""
+    scheme, sep, rest = url.partition("://")
+    if not sep or scheme.endswith("+pool"):
+        return url
+    return f"{scheme}+pool://{rest}"
+
+database_url = pooled_url(os.getenv("DATABASE_URL", "sqlite:///hem.db"))
+
+# pooled connections are handed to whichever thread checks them out next
+sqlite_options = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+
+db = connect(
+    database_url,
+    max_connections=constants.database_max_connections,
+    stale_timeout=constants.database_stale_timeout,
+    timeout=constants.database_pool_timeout,
+    **sqlite_options,
+)
+
+@contextmanager
+def connection():
+    """Hold a pooled connection for the duration of the block, returning it only if the block checked it out.
+    For work outside of a request (worker threads), where nothing else would hand the connection back to the pool."""
+    opened = db.connect(reuse_if_open=True)
+    try:
+        yield
+    finally:
+        if opened and not db.is_closed():
+            db.close()
+
+def with_connection(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with connection():
+            return func(*args, **kwargs)
+    return wrapper
+
+def pool_stats() -> dict:
+    """Pool occupancy, read from peewee's pool internals (absent when the url is not pooled)."""
+    in_use = len(getattr(db, "_in_use", {}))
+    available = len(getattr(db, "_connections", []))
+    return {
+        "max_connections": getattr(db, "_max_connections", None),
+        "in_use": in_use,
+        "available": available,
+        "open": in_use + available,
+    }
 
 class BaseModel(Model):
     class Meta:
@@ -12,6 +62,10 @@ class BaseModel(Model):
 class User(BaseModel):
     id = UUIDField(primary_key=True, default=uuid4)
 
+class UserSettings(BaseModel):
+    user = ForeignKeyField(User, primary_key=True, backref='settings', on_delete='CASCADE')
+    fast_path = BooleanField(default=True) # answer simple commands (time, date) without the llm
+
 class Action(BaseModel):
     id = UUIDField(primary_key=True, default=uuid4)
     name = CharField(unique=True)
@@ -30,4 +84,13 @@ class MacroAction(BaseModel):
 
 class UserAction(BaseModel):
     user = ForeignKeyField(User, backref='actions', on_delete='CASCADE')
-    action = ForeignKeyField(Action, backref='used_by', on_delete='CASCADE')
\ No newline at end of file
+    action = ForeignKeyField(Action, backref='used_by', on_delete='CASCADE')
+
+class Place(BaseModel):
+    key = CharField(index=True) # normalized name used for lookups
+    name = CharField()
+    country = CharField(default="")
+    lat = FloatField()
+    lon = FloatField()
+    population = IntegerField(default=0)
+    source = CharField(default="gazetteer") # gazetteer or nominatim
@@ -4,8 +4,12 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from db.models import db, Action
+import csv
+import os
+from db.models import db, Action, Place
 from lib.actions import Actions
+from lib.geocode import normalize_place_name
+from globals import constants
 
 
 def seed_actions_from_registry():
@@ -42,8 +46,35 @@ def seed_actions_from_registry():
 
     print(f"✅ {created} new actions created, {updated} actions updated.")
 
+def seed_places_from_gazetteer(path: str):
+    """Seed the Place table from a GeoNames cities export (tab separated, e.g. cities15000.txt)."""
+    if not os.path.exists(path):
+        print(f"⚠️ Gazetteer not found at {path}, skipping places.")
+        return
+
+    rows = []
+    with open(path, newline="", encoding="utf-8") as file:
+        for record in csv.reader(file, delimiter="\t", quoting=csv.QUOTE_NONE):
+            name, ascii_name, alternate_names = record[1], record[2], record[3]
+            lat, lon, country, population = float(record[4]), float(record[5]), record[8], int(record[14] or 0)
+
+            # index the native, ascii and latin-script alternate spellings (e.g. "Munich" for "München")
+            spellings = [name, ascii_name, *alternate_names.split(",")]
+            for key in {normalize_place_name(spelling) for spelling in spellings}:
+                if key:
+                    rows.append({"key": key, "name": name, "country": country, "lat": lat, "lon": lon, "population": population})
+
+    with db.atomic():
+        # replace previously seeded places, keep the ones learned from nominatim
+        Place.delete().where(Place.source == "gazetteer").execute()
+        for start in range(0, len(rows), 500):
+            Place.insert_many(rows[start:start + 500]).execute()
+
+    print(f"✅ {len(rows)} place names seeded from {path}.")
+
 if __name__ == "__main__":
     db.connect(reuse_if_open=True)
-    db.create_tables([Action], safe=True)
+    db.create_tables([Action, Place], safe=True)
     seed_actions_from_registry()
+    seed_places_from_gazetteer(constants.gazetteer_path)
     db.close()
\ No newline at end of file
@@ -1,6 +1,7 @@
 import dataclasses
 from typing import List, Optional
-from db.models import User
+from peewee import JOIN
+from db.models import User, Action, MacroAction, Macro as MacroModel, with_connection
 
 @dataclasses.dataclass
 class Macro:
@@ -9,22 +10,39 @@ class Macro:
     prompt: str
     allow_other_actions: bool
     required_actions: List[str]
+    required_action_ids: List[str] = dataclasses.field(default_factory=list)
 
+@with_connection
 def get_user_macros(user_id: str) -> Optional[List[Macro]]:
-    """Get a user's macros by their ID."""
-    try:
-        u = User.get(User.id == user_id)
-    except Exception:
+    """Get a user's macros by their ID, with their required actions, in a single joined query."""
+    rows = (
+        MacroModel
+        .select(MacroModel.id, MacroModel.name, MacroModel.prompt, MacroModel.allow_other_actions, Action.id, Action.name)
+        .join(MacroAction, JOIN.LEFT_OUTER)
+        .join(Action, JOIN.LEFT_OUTER)
+        .where(MacroModel.user == user_id)
+        .tuples()
+    )
+
+    macros: dict[str, Macro] = {}
+    for macro_id, name, prompt, allow_other_actions, action_id, action_name in rows:
+        macro = macros.get(str(macro_id))
+        if macro is None:
+            macro = macros[str(macro_id)] = Macro(
+                id=str(macro_id),
+                name=name,
+                prompt=prompt,
+                allow_other_actions=allow_other_actions,
+                required_actions=[]
+            )
+
+        # macros without required actions come back with a single empty action row
+        if action_id is not None:
+            macro.required_actions.append(action_name)
+            macro.required_action_ids.append(str(action_id))
+
+    # no macros -> tell a user without macros apart from a missing user
+    if not macros and not User.select().where(User.id == user_id).exists():
         return None
-    
-    macros: list[Macro] = []
-    for m in u.macros:
-        macros.append(Macro(
-            id=str(m.id),
-            name=m.name,
-            prompt=m.prompt,
-            allow_other_actions=m.allow_other_actions,
-            required_actions=[ma.action.name for ma in m.required_actions]
-        ))
 
-    return macros
\ No newline at end of file
+    return list(macros.values())
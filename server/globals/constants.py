@@ -1,10 +1,126 @@
+import os
+
 # ---------------------------------- general --------------------------------- #
 vosk_model_identifier = "vosk-model-small-en-us-0.15"
 vosk_model_path = f"tmp/{vosk_model_identifier}"
+startup_mode = os.getenv("STARTUP_MODE", "eager") # eager (load models before serving), background (load them while serving health checks) or lazy (on first use)
 
 # --------------------------------- processor -------------------------------- #
 max_tokens = 512
 model = "claude-3-5-haiku-latest"
+action_workers = 16 # threads shared by all requests for executing tool calls
+action_timeout = 15 # seconds a tool call may take before its result is reported as timed out
+max_tool_rounds = 5 # tool rounds per message before the model has to answer without tools
+intent_fast_path = True # answer simple commands (time, date) locally, unless a user turned it off
+tool_relevance_filter = False # only send tools whose keywords appear in the message (all tools when none match)
+
+# --------------------------------- database --------------------------------- #
+database_max_connections = int(os.getenv("DATABASE_MAX_CONNECTIONS", "20")) # pooled connections per process
+database_stale_timeout = int(os.getenv("DATABASE_STALE_TIMEOUT", "300")) # seconds before an idle pooled connection is recycled
+database_pool_timeout = int(os.getenv("DATABASE_POOL_TIMEOUT", "10")) # seconds to wait for a free connection when the pool is exhausted
+
+# ---------------------------------- macros ---------------------------------- #
+macro_import_max_macros = 500 # macros accepted by one bulk import request
+macro_insert_batch_size = 500 # rows per multi-row insert
+
+# ------------------------------- conversations ------------------------------ #
+conversation_db_path = os.getenv("CONVERSATION_DB_PATH", "") # sqlite file persisting conversations, in memory only when unset
+conversation_max_entries = 4096 # conversations kept in memory
+conversation_idle_timeout = 10 * 60 # seconds of silence after which the next message starts a new conversation
+conversation_max_turns = 8 # most recent turns kept as history
+conversation_token_budget = 4000 # estimated input tokens of history (and of one request's tool rounds) before compacting
+conversation_compacted_result_chars = 160 # characters of a tool result kept once it is compacted
+conversation_compaction_step = 4 # messages (two tool rounds) a request's compacted prefix grows by at a time, keeping it cacheable
 
 # ---------------------------------- prompts --------------------------------- #
-prompts_dir = "prompts"
\ No newline at end of file
+prompts_dir = "prompts"
+user_prompt_cache_max_entries = 4096 # compiled per-user system prompts kept in memory
+user_prompt_cache_ttl = 5 * 60 # seconds, bounds staleness when another worker process changed the macros
+
+# ---------------------------------- speech ---------------------------------- #
+tts_min_chunk_chars = 24 # shortest text chunk sent for synthesis while streaming
+
+# ------------------------------ response cache ------------------------------ #
+response_cache_max_entries = 4096 # serialized endpoint payloads kept in memory
+response_cache_ttl = 60 # seconds, bounds staleness after changes made by another process (e.g. db.seed)
+
+# -------------------------------- recognition ------------------------------- #
+recognition_sample_rate = 16000 # default sample rate of streamed PCM frames
+recognition_chunk_bytes = 8000 # bytes read from a streamed request body per recognizer call
+recognition_session_timeout = 120 # seconds before an idle recognition session is dropped
+recognition_speculative_responses = os.getenv("RECOGNITION_SPECULATION", "false").lower() == "true" # start responding once the user pauses after an utterance
+recognition_speculation_silence = 0.6 # seconds without speech after a finalized utterance before speculating
+recognition_speculation_workers = 4
+
+# ------------------------------- transcription ------------------------------ #
+transcription_workers = int(os.getenv("TRANSCRIPTION_WORKERS", "2")) # worker processes, each holding a vosk model
+transcription_queue_size = int(os.getenv("TRANSCRIPTION_QUEUE_SIZE", "8")) # jobs allowed to wait for a free worker
+transcription_queue_timeout = 5 # seconds to wait for a queue slot before rejecting a request
+
+# ----------------------------------- jobs ----------------------------------- #
+respond_mode = os.getenv("RESPOND_MODE", "inline") # inline or job (enqueue /respond and poll for the audio), overridable per request with ?mode=
+job_db_path = os.getenv("JOB_DB_PATH", "tmp/jobs.db") # sqlite file shared by the web and worker processes
+job_workers = int(os.getenv("JOB_WORKERS", "2")) # worker processes started by worker.py
+job_worker_threads = int(os.getenv("JOB_WORKER_THREADS", "4")) # jobs each worker process runs at once (mostly waiting on upstreams)
+job_queue_size = int(os.getenv("JOB_QUEUE_SIZE", "256")) # queued jobs before new ones are rejected
+job_poll_interval = 0.25 # seconds between queue checks of idle workers and long-polling requests
+job_long_poll_max = 30 # longest a status request may wait for its job, in seconds
+job_timeout = 5 * 60 # seconds a running job may take before it is considered abandoned and requeued
+job_max_attempts = 2
+job_retention = 60 * 60 # seconds finished jobs and their audio are kept
+job_recover_interval = 30 # seconds between checks for abandoned and expired jobs
+
+# ------------------------------- text to speech ----------------------------- #
+tts_backend = os.getenv("TTS_BACKEND", "elevenlabs") # elevenlabs, local or fake
+tts_fallback_backend = os.getenv("TTS_FALLBACK_BACKEND", "") # used when the primary backend is slow or fails
+tts_fallback_timeout = 2.0 # seconds to wait for the primary backend's first chunk
+tts_chunk_bytes = 4096 # chunk size of locally produced audio
+local_tts_voice = "en-us"
+fake_tts_latency = float(os.getenv("FAKE_TTS_LATENCY", "0.2")) # seconds before the fake backend's first chunk
+fake_tts_seconds_per_char = 0.06 # duration of fake speech per character of text
+tts_voice_id = "JBFqnCBsd6RMkjVDRZzb"
+tts_model_id = "eleven_multilingual_v2"
+tts_output_format = "mp3_44100_128"
+speech_cache_dir = os.getenv("SPEECH_CACHE_DIR", "tmp/speech-cache")
+speech_cache_memory_bytes = 32 * 1024 * 1024 # in-memory tier bound
+speech_cache_disk_bytes = 512 * 1024 * 1024 # disk tier bound
+
+# --------------------------------- upstreams -------------------------------- #
+# overridable to point the server at stand-in servers (see bench/), anthropic's client reads ANTHROPIC_BASE_URL itself
+open_weather_base_url = os.getenv("OPEN_WEATHER_BASE_URL", "https://api.openweathermap.org")
+nominatim_base_url = os.getenv("NOMINATIM_BASE_URL", "https://nominatim.openstreetmap.org")
+market_stack_base_url = os.getenv("MARKET_STACK_BASE_URL", "http://api.marketstack.com")
+coingecko_base_url = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com")
+eleven_labs_base_url = os.getenv("ELEVEN_LABS_BASE_URL", "https://api.elevenlabs.io")
+
+# ----------------------------------- http ----------------------------------- #
+http_default_pool_size = 10
+http_pool_sizes = { # per-host connection pool sizes
+    open_weather_base_url: 10,
+    nominatim_base_url: 2, # nominatim allows 1 request per second
+    market_stack_base_url: 5,
+    coingecko_base_url: 5,
+}
+http_retries = 2
+http_backoff_factor = 0.2 # seconds, doubled on every retry
+http_backoff_jitter = 0.1 # random seconds added to each backoff
+http_latency_buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ---------------------------------- tracing --------------------------------- #
+stage_latency_buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # seconds
+token_buckets = (100, 250, 500, 1000, 2000, 4000, 8000, 16000) # llm tokens per message
+tool_round_buckets = (0, 1, 2, 3, 5, 8) # tool rounds per message
+server_timing = os.getenv("SERVER_TIMING", "false").lower() == "true" # add a Server-Timing header with the stage timings of a request
+
+# ---------------------------------- actions --------------------------------- #
+action_cache_max_entries = 2048 # action results kept in memory, least recently used are evicted first
+batch_window = 0.05 # seconds concurrent market data lookups are collected before one upstream call
+stock_batch_size = 50 # tickers per marketstack request
+stock_rows_per_request = 5 # end of day rows returned per get_stock_info call, split across its tickers
+crypto_batch_size = 100 # coin IDs per coingecko request
+
+# --------------------------------- geocoding -------------------------------- #
+gazetteer_path = "db/data/cities15000.txt" # geonames cities export used to seed the geocode index
+geocode_min_prefix_length = 4 # shorter names are only matched exactly
+geocode_fuzzy_candidates = 2000
+geocode_fuzzy_cutoff = 0.85
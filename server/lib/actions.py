@@ -1,14 +1,25 @@
 from typing import cast, Callable, Union, Tuple
+from concurrent.futures import Future
 from urllib.parse import quote_plus
 from anthropic.types import ToolParam, TextBlockParam
 import os
 import json
 import requests
+from lib import stats, tracing
+from lib.http_session import PooledSession
+from lib.ttl_cache import TTLCache
+from lib.geocode import Gazetteer
+from db.models import connection
+from lib.batcher import Coalescer, MissingBatchResult
+from globals import constants
 from datetime import datetime
 
 type ExecutableActionResponse = Union[str, list[TextBlockParam]]
 type ExecutableAction = Callable[..., ExecutableActionResponse]
 
+geocode_url = f"{constants.nominatim_base_url}/search"
+geocode_headers = {"User-Agent": "claude-tools/1.0"}
+
 class Actions:
     """Handles the registration and execution of actions."""
     _instance = None
@@ -20,6 +31,16 @@ class Actions:
 
     def __init__(self):
         if not hasattr(self, "action_registry"):
+            self.http = PooledSession() # shared keep-alive connections for every action
+            stats.register("http", self.http.stats)
+
+            # concurrent market data lookups from different requests share upstream calls
+            self.stock_batcher = Coalescer("stock_batcher", self._fetch_stock_batch, constants.batch_window, constants.stock_batch_size)
+            self.crypto_batcher = Coalescer("crypto_batcher", self._fetch_crypto_batch, constants.batch_window, constants.crypto_batch_size)
+
+            self.cache = TTLCache(constants.action_cache_max_entries) # action results, expiring per __cache_ttl__
+            stats.register("action_cache", self.cache.stats)
+
             self.action_registry: dict[str, Callable] = {
                 cast(ToolParam, item.__action__)['name']: cast(ExecutableAction, item)
                 for item in Actions.__dict__.values()
@@ -32,12 +53,38 @@ class Actions:
                 if hasattr(item, "__action__")
             ]
 
+    @staticmethod
+    def _normalize_input(value):
+        """Normalize action input so equivalent requests share a cache entry."""
+        if isinstance(value, str):
+            return " ".join(value.split()).casefold()
+        if isinstance(value, list):
+            return [Actions._normalize_input(item) for item in value]
+        if isinstance(value, dict):
+            return {key: Actions._normalize_input(item) for key, item in value.items()}
+        return value
+
+    @staticmethod
+    def cache_key(action_identifier: str, action_input: dict) -> tuple[str, str]:
+        return action_identifier, json.dumps(Actions._normalize_input(action_input), sort_keys=True)
+
     def execute(self, action_identifier: str, action_input: dict) -> str:
-        """Executes the action with the given name and input."""
+        """Executes the action with the given name and input, serving fresh results from the action cache."""
         if action_identifier not in self.action_registry:
             raise ValueError(f"Action {action_identifier} not found.")
         action = self.action_registry[action_identifier]
-        return action(self, **action_input)
+
+        # actions mostly run on executor threads: hand a connection they checked out back to the pool when done
+        with tracing.span(f"action.{action_identifier}"), connection():
+            ttl = getattr(action, "__cache_ttl__", 0)
+            if not ttl:
+                return action(self, **action_input)
+
+            return self.cache.get_or_compute(
+                Actions.cache_key(action_identifier, action_input),
+                ttl,
+                lambda: action(self, **action_input),
+            )
 
     # ------------------------------ get_weather ------------------------------ #
 
@@ -45,24 +92,29 @@ class Actions:
         """
         Fetches current weather and daily forecast for the provided city.
         """
-        api_key = os.environ.get("OPEN_WEATHER_API_KEY")
-        if not api_key:
-            raise ValueError("API key for OpenWeatherMap is not set.")
-
         lat, lon = self._geocode(location)
 
-        url = (
-            f"https://api.openweathermap.org/data/3.0/onecall"
-            f"?lat={lat}&lon={lon}&appid={api_key}&units=imperial"
-        )
-
         try:
-            resp = requests.get(url, timeout=10)
+            resp = self.http.get(Actions._weather_url(lat, lon), timeout=10)
             resp.raise_for_status()
         except requests.RequestException as e:
             raise ValueError(f"Network error fetching weather data: {e}")
 
-        data = resp.json()
+        return Actions._format_weather(location, resp.json())
+
+    @staticmethod
+    def _weather_url(lat: float, lon: float) -> str:
+        api_key = os.environ.get("OPEN_WEATHER_API_KEY")
+        if not api_key:
+            raise ValueError("API key for OpenWeatherMap is not set.")
+
+        return (
+            f"{constants.open_weather_base_url}/data/3.0/onecall"
+            f"?lat={lat}&lon={lon}&appid={api_key}&units=imperial"
+        )
+
+    @staticmethod
+    def _format_weather(location: str, data: dict) -> ExecutableActionResponse:
         current = data.get("current", {})
         temp = current.get("temp")
         weather = current.get("weather", [])
@@ -97,6 +149,8 @@ class Actions:
             "required": ["location"]
         }
     )
+    get_weather.__cache_ttl__ = 10 * 60
+    get_weather.__keywords__ = ("weather", "forecast", "temperature", "rain", "snow", "wind", "sunny", "hot", "cold", "umbrella")
 
     # ------------------------------ get_time ------------------------------ #
 
@@ -113,6 +167,7 @@ class Actions:
             "required": []
         }
     )
+    get_time.__keywords__ = ("time", "clock", "hour", "o'clock", "late", "early")
 
     # ------------------------------ get_date ------------------------------ #
 
@@ -129,31 +184,61 @@ class Actions:
             "required": []
         }
     )
+    get_date.__keywords__ = ("date", "day", "today", "tomorrow", "yesterday", "month", "year", "week", "weekday")
     # ------------------------------ get_stock_info ------------------------------ #
 
     def get_stock_info(self, tickers: list[str]) -> ExecutableActionResponse:
         """
         Retrieves current stock prices and related financial data for a list of provided stock tickers.
         """
-        api_key = os.getenv("MARKET_STACK_API_KEY")
-        if not api_key:
-            raise ValueError("API key for MarketStack is not set.")
+        futures = self._submit_stock_lookups(tickers)
+        return Actions._format_stocks([future.result() for future in futures])
 
-        url = "http://api.marketstack.com/v2/eod" + "?access_key=" + api_key + "&symbols="
-        url += ",".join(tickers)
-        url += "&limit=5"
+    def _submit_stock_lookups(self, tickers: list[str]) -> list[Future]:
+        """Queue each ticker on the stock batcher, returning futures of their end of day rows."""
+        return [self.stock_batcher.submit(None, ticker.strip().upper()) for ticker in tickers]
+
+    @staticmethod
+    def _format_stocks(rows_by_ticker: list[list[dict]]) -> ExecutableActionResponse:
+        # keep the response at the same number of rows however many tickers were requested
+        rows_per_ticker = max(1, constants.stock_rows_per_request // max(1, len(rows_by_ticker)))
 
+        rows = []
+        for ticker_rows in rows_by_ticker:
+            rows.extend(ticker_rows[:rows_per_ticker])
+
+        return [TextBlockParam(type="text", text=json.dumps(d)) for d in rows]
+
+    def _fetch_stock_batch(self, group: None, tickers: list[str]) -> dict[str, list[dict]]:
+        """Fetch the latest end of day rows for many tickers in one request, grouped by ticker."""
         try:
-            response = requests.get(url, timeout=10)
+            response = self.http.get(Actions._stock_url(tickers, limit=len(tickers) * constants.stock_rows_per_request), timeout=10)
             response.raise_for_status()
         except requests.RequestException as e:
             raise ValueError(f"Network error fetching stock data: {e}")
 
-        data = response.json()
+        rows_by_ticker: dict[str, list[dict]] = {ticker: [] for ticker in tickers}
+        for row in Actions._stock_rows(response.json()):
+            rows_by_ticker.setdefault(str(row.get("symbol", "")).upper(), []).append(row)
+        return rows_by_ticker
+
+    @staticmethod
+    def _stock_url(tickers: list[str], limit: int = 5) -> str:
+        api_key = os.getenv("MARKET_STACK_API_KEY")
+        if not api_key:
+            raise ValueError("API key for MarketStack is not set.")
+
+        url = f"{constants.market_stack_base_url}/v2/eod" + "?access_key=" + api_key + "&symbols="
+        url += ",".join(tickers)
+        url += f"&limit={limit}"
+        return url
+
+    @staticmethod
+    def _stock_rows(data: dict) -> list[dict]:
         if "error" in data:
             raise ValueError(f"Error fetching stock data: {data['error']}")
         
-        return [TextBlockParam(type="text", text=json.dumps(d)) for d in data['data']]
+        return data['data']
 
     get_stock_info.__action__ = ToolParam(
         name="get_stock_info",
@@ -176,6 +261,8 @@ class Actions:
             "required": ["tickers"]
         }
     )
+    get_stock_info.__cache_ttl__ = 3 * 60 * 60 # end of day data
+    get_stock_info.__keywords__ = ("stock", "stocks", "share", "shares", "ticker", "market", "price", "nasdaq", "trading")
 
         # ------------------------------ get_crypto_price ------------------------------ #
 
@@ -183,23 +270,37 @@ class Actions:
         """
         Fetches the live cryptocurrency price and metadata from Coingecko.
         """
-        url = (
-            "https://api.coingecko.com/api/v3/coins/markets"
-            f"?vs_currency={quote_plus(currency)}&ids={quote_plus(coin)}"
-        )
+        try:
+            data = self._submit_crypto_lookup(coin, currency).result()
+        except MissingBatchResult:
+            raise ValueError(f"No data found for coin '{coin}' in currency '{currency}'.")
 
+        return Actions._format_crypto(data)
+
+    def _submit_crypto_lookup(self, coin: str, currency: str) -> Future:
+        """Queue a coin on the crypto batcher of its currency, returning a future of its market data."""
+        return self.crypto_batcher.submit(currency.strip().lower(), coin.strip().lower())
+
+    def _fetch_crypto_batch(self, currency: str, coins: list[str]) -> dict[str, dict]:
+        """Fetch market data for many coins in one currency with a single request, keyed by coin ID."""
         try:
-            resp = requests.get(url, timeout=10)
+            resp = self.http.get(Actions._crypto_url(coins, currency), timeout=10)
             resp.raise_for_status()
         except requests.RequestException as e:
             raise ValueError(f"Network error fetching crypto data: {e}")
 
-        data = resp.json()
+        return {str(row.get("id", "")).lower(): row for row in resp.json()}
 
-        if not data:
-            raise ValueError(f"No data found for coin '{coin}' in currency '{currency}'.")
+    @staticmethod
+    def _crypto_url(coins: list[str], currency: str) -> str:
+        return (
+            f"{constants.coingecko_base_url}/api/v3/coins/markets"
+            f"?vs_currency={quote_plus(currency)}&ids={quote_plus(','.join(coins))}"
+        )
 
-        return [TextBlockParam(type="text", text=f"{key}: {value}") for key, value in data[0].items()]
+    @staticmethod
+    def _format_crypto(data: dict) -> ExecutableActionResponse:
+        return [TextBlockParam(type="text", text=f"{key}: {value}") for key, value in data.items()]
 
     get_crypto_price.__action__ = ToolParam(
         name="get_crypto_price",
@@ -224,6 +325,8 @@ class Actions:
             "required": ["coin", "currency"]
         }
     )
+    get_crypto_price.__cache_ttl__ = 30
+    get_crypto_price.__keywords__ = ("crypto", "cryptocurrency", "coin", "bitcoin", "btc", "ethereum", "eth", "solana", "dogecoin", "price")
 
 
     # ------------------------------ _geocode ------------------------------ #
@@ -232,17 +335,36 @@ class Actions:
         """
         Helper: Convert a city name into (lat, lon) via OpenStreetMap Nominatim.
         """
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {"q": city, "format": "json", "limit": 1}
-        headers = {"User-Agent": "claude-tools/1.0"}
+        return self.cache.get_or_compute(
+            Actions.cache_key("_geocode", {"city": city}),
+            Actions._geocode.__cache_ttl__,
+            lambda: self._fetch_geocode(city),
+        )
+
+    _geocode.__cache_ttl__ = float("inf") # places do not move
+
+    def _fetch_geocode(self, city: str) -> Tuple[float, float]:
+        # local index first, nominatim only on a miss
+        location = Gazetteer.lookup(city)
+        if location:
+            return location
 
         try:
-            resp = requests.get(url, params=params, headers=headers, timeout=5)
+            resp = self.http.get(geocode_url, params=Actions._geocode_params(city), headers=geocode_headers, timeout=5)
             resp.raise_for_status()
         except requests.RequestException as e:
             raise ValueError(f"Network error during geocoding: {e}")
 
-        results = resp.json()
+        lat, lon = Actions._parse_geocode(city, resp.json())
+        Gazetteer.remember(city, lat, lon)
+        return lat, lon
+
+    @staticmethod
+    def _geocode_params(city: str) -> dict:
+        return {"q": city, "format": "json", "limit": 1}
+
+    @staticmethod
+    def _parse_geocode(city: str, results: list) -> Tuple[float, float]:
         if not results:
             raise ValueError(f"Could not geocode city '{city}'")
 
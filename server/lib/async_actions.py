@@ -0,0 +1,126 @@
+from typing import Awaitable, Callable, Tuple
+import asyncio
+import httpx
+from lib.actions import Actions, ExecutableActionResponse, geocode_url, geocode_headers
+from lib.geocode import Gazetteer
+from lib.batcher import MissingBatchResult
+from lib import tracing
+
+type AsyncExecutableAction = Callable[..., Awaitable[ExecutableActionResponse]]
+
+class AsyncActions:
+    """Asyncio counterparts of the network bound actions, sharing one pooled async HTTP client (singleton).
+    Market data lookups await the shared batchers; actions without an async counterpart run in a worker thread."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(AsyncActions, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.actions = Actions()
+        self.client: httpx.AsyncClient | None = None
+        self.async_registry: dict[str, AsyncExecutableAction] = {
+            "get_weather": AsyncActions.get_weather,
+            "get_stock_info": AsyncActions.get_stock_info,
+            "get_crypto_price": AsyncActions.get_crypto_price,
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared async HTTP client, creating it on first use inside the running event loop."""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self.client
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def execute(self, action_identifier: str, action_input: dict) -> ExecutableActionResponse:
+        """Executes the action with the given name and input without blocking the event loop."""
+        if action_identifier not in self.actions.action_registry:
+            raise ValueError(f"Action {action_identifier} not found.")
+
+        if action_identifier not in self.async_registry:
+            return await asyncio.to_thread(self.actions.execute, action_identifier, action_input)
+
+        async_action = self.async_registry[action_identifier]
+        ttl = getattr(self.actions.action_registry[action_identifier], "__cache_ttl__", 0)
+
+        with tracing.span(f"action.{action_identifier}"):
+            if not ttl:
+                return await async_action(self, **action_input)
+
+            # shares entries and in-flight calls with the threaded Actions
+            return await self.actions.cache.aget_or_compute(
+                Actions.cache_key(action_identifier, action_input),
+                ttl,
+                lambda: async_action(self, **action_input),
+            )
+
+    async def _get_json(self, url: str, error_message: str, **kwargs):
+        """GET a url with the shared client and decode the JSON body, raising ValueError on network errors."""
+        try:
+            resp = await self._get_client().get(url, **kwargs)
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            raise ValueError(f"{error_message}: {e}")
+        return resp.json()
+
+    # ------------------------------ get_weather ------------------------------ #
+
+    async def get_weather(self, location: str) -> ExecutableActionResponse:
+        lat, lon = await self._geocode(location)
+        data = await self._get_json(Actions._weather_url(lat, lon), "Network error fetching weather data")
+        return Actions._format_weather(location, data)
+
+    # ------------------------------ get_stock_info ------------------------------ #
+
+    async def get_stock_info(self, tickers: list[str]) -> ExecutableActionResponse:
+        futures = self.actions._submit_stock_lookups(tickers)
+        rows_by_ticker = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return Actions._format_stocks(list(rows_by_ticker))
+
+    # ------------------------------ get_crypto_price ------------------------------ #
+
+    async def get_crypto_price(self, coin: str, currency: str) -> ExecutableActionResponse:
+        try:
+            data = await asyncio.wrap_future(self.actions._submit_crypto_lookup(coin, currency))
+        except MissingBatchResult:
+            raise ValueError(f"No data found for coin '{coin}' in currency '{currency}'.")
+
+        return Actions._format_crypto(data)
+
+    # ------------------------------ _geocode ------------------------------ #
+
+    async def _geocode(self, city: str) -> Tuple[float, float]:
+        return await self.actions.cache.aget_or_compute(
+            Actions.cache_key("_geocode", {"city": city}),
+            Actions._geocode.__cache_ttl__,
+            lambda: self._fetch_geocode(city),
+        )
+
+    async def _fetch_geocode(self, city: str) -> Tuple[float, float]:
+        # local index first, nominatim only on a miss
+        location = await asyncio.to_thread(Gazetteer.lookup, city)
+        if location:
+            return location
+
+        results = await self._get_json(
+            geocode_url,
+            "Network error during geocoding",
+            params=Actions._geocode_params(city),
+            headers=geocode_headers,
+            timeout=5,
+        )
+        lat, lon = Actions._parse_geocode(city, results)
+        await asyncio.to_thread(Gazetteer.remember, city, lat, lon)
+        return lat, lon
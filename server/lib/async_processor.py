@@ -0,0 +1,99 @@
+from functools import cached_property
+from typing import cast
+import asyncio
+import itertools
+from anthropic.types import MessageParam, ToolUseBlock, ToolResultBlockParam
+import anthropic
+from globals import constants
+from lib.async_actions import AsyncActions
+from lib.processor import Processor, prompts, usage_tracker, conversations, intent_router, tool_selector
+from lib.usage import RequestUsage
+from lib import tracing
+
+async_actions = AsyncActions() # initialize the AsyncActions class (singleton)
+
+class AsyncProcessor:
+    """Asyncio variant of the Processor: waiting on the llm and on actions does not hold a thread."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(AsyncProcessor, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+
+    @cached_property
+    def client(self) -> anthropic.AsyncAnthropic:
+        """Created on first use, or while starting up (see lib.startup)."""
+        return anthropic.AsyncAnthropic()
+
+    @staticmethod
+    async def _execute_tool(tool_block: ToolUseBlock) -> ToolResultBlockParam:
+        """Execute a single tool call, reporting failures and timeouts as error results."""
+        tool_result = ToolResultBlockParam(type="tool_result", tool_use_id=tool_block.id)
+
+        try:
+            action_result = await asyncio.wait_for(
+                async_actions.execute(tool_block.name, cast(dict, tool_block.input)),
+                timeout=constants.action_timeout,
+            )
+            tool_result.update(content=action_result)
+        except asyncio.TimeoutError:
+            tool_result.update(content=f"Action timed out after {constants.action_timeout} seconds.", is_error=True)
+        except Exception as e:
+            tool_result.update(content=str(e), is_error=True)
+
+        return tool_result
+
+    async def handle_message(self, user_id: str, user_prompt: str) -> tuple[str, list[str]]:
+        """Handles an incoming message from a specific user and returns a text response and a list of actions performed."""
+        # simple commands -> answered without the llm
+        fast_turn = await asyncio.to_thread(intent_router.route, user_id, user_prompt)
+        if fast_turn:
+            await asyncio.to_thread(conversations.append, user_id, fast_turn)
+            return fast_turn.text, fast_turn.actions_performed
+
+        history = await asyncio.to_thread(conversations.history, user_id)
+        messages: list[MessageParam] = [
+            {"role": "user", "content": user_prompt}
+        ]
+
+        actions_performed: list[str] = []
+        request_usage = RequestUsage()
+
+        # load macros and generate system prompt (cached until the user's macros change)
+        compiled_prompt = await asyncio.to_thread(prompts.get_user_prompt, user_id)
+        system_prompt = compiled_prompt.system_blocks
+        tools = Processor._cacheable_tools(tool_selector.select(compiled_prompt.macros, user_prompt, history))
+
+        for tool_round in itertools.count():
+            with tracing.span("llm"):
+                response = await self.client.messages.create(
+                    model=constants.model,
+                    max_tokens=constants.max_tokens,
+                    system=system_prompt,
+                    messages=Processor._cacheable_messages(conversations.fit_request(history + messages)),
+                    **Processor._tool_options(tools, tool_round),
+                )
+            request_usage.add(response.usage)
+
+            text_block = next((item for item in response.content if item.type == "text"), None)
+            tool_blocks = [item for item in response.content if item.type == "tool_use"]
+
+            # no tool use -> return llm final response
+            if not tool_blocks or tool_round >= constants.max_tool_rounds:
+                usage_tracker.record(user_id, request_usage)
+                text = Processor._remove_enclosed_tag_data(text_block.text, "input_analysis") if text_block else ""
+                await asyncio.to_thread(conversations.append, user_id, Processor._finish_turn(messages, text, actions_performed))
+                return text, actions_performed
+
+            # requested tool use -> run all tools concurrently and append results to messages
+            actions_performed.extend(tool_block.name for tool_block in tool_blocks)
+            tool_results = await asyncio.gather(*(AsyncProcessor._execute_tool(tool_block) for tool_block in tool_blocks))
+
+            messages.append(Processor._assistant_message(response))
+            messages.append(cast(MessageParam, {"role": "user", "content": list(tool_results)}))
@@ -0,0 +1,100 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+import threading
+from lib import stats
+
+type BatchFetcher = Callable[[Hashable, list[str]], dict[str, Any]]
+
+class MissingBatchResult(LookupError):
+    """Raised for a key the batched upstream call returned no result for."""
+
+class Coalescer:
+    """Collects concurrent lookups for a short window and resolves them with one batched upstream call per group.
+    Lookups of the same key within a window share one slot in the batch, a lone lookup is sent right away."""
+
+    def __init__(self, name: str, fetch_batch: BatchFetcher, window: float, max_batch: int) -> None:
+        self.fetch_batch = fetch_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.pending: dict[Hashable, dict[str, Future]] = {} # group -> key -> future
+        self.lock = threading.Lock()
+        self.requested = 0
+        self.upstream_calls = 0
+        self.split_batches = 0
+        self.in_flight = 0 # batches being fetched
+        stats.register(name, self.stats)
+
+    def submit(self, group: Hashable, key: str) -> Future:
+        """Queue a key for the next batched call of its group and return a future of its result."""
+        flush_now = False
+        with self.lock:
+            self.requested += 1
+            batch = self.pending.get(group)
+
+            # first key of a new batch -> flush it when the window closes, right away when nothing else is going on
+            if batch is None:
+                batch = self.pending[group] = {}
+                window = self.window if self.in_flight or len(self.pending) > 1 else 0
+                timer = threading.Timer(window, self._flush, args=(group, batch))
+                timer.daemon = True
+                timer.start()
+
+            if key not in batch:
+                batch[key] = Future()
+            future = batch[key]
+
+            if len(batch) >= self.max_batch:
+                flush_now = True
+
+        if flush_now:
+            self._flush(group, batch)
+        return future
+
+    def _flush(self, group: Hashable, batch: dict[str, Future]) -> None:
+        """Resolve every future of a batch with batched upstream calls (no-op if the batch was already flushed)."""
+        with self.lock:
+            if self.pending.get(group) is not batch:
+                return
+            del self.pending[group]
+            self.in_flight += 1
+
+        try:
+            self._resolve(group, batch)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _resolve(self, group: Hashable, batch: dict[str, Future]) -> None:
+        with self.lock:
+            self.upstream_calls += 1
+
+        try:
+            results = self.fetch_batch(group, list(batch))
+        except Exception as e:
+            if len(batch) == 1:
+                next(iter(batch.values())).set_exception(e)
+                return
+
+            # one bad key (e.g. an unknown ticker) must not fail the other lookups -> retry the halves
+            with self.lock:
+                self.split_batches += 1
+            keys = list(batch)
+            middle = len(keys) // 2
+            self._resolve(group, {key: batch[key] for key in keys[:middle]})
+            self._resolve(group, {key: batch[key] for key in keys[middle:]})
+            return
+
+        for key, future in batch.items():
+            if key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(MissingBatchResult(f"No data found for '{key}'."))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "requested": self.requested,
+                "upstream_calls": self.upstream_calls,
+                "split_batches": self.split_batches,
+                "pending_groups": len(self.pending),
+            }
@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from typing import Any, cast
+from anthropic.types import MessageParam
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+import time
+from globals import constants
+from lib import stats
+
+@dataclasses.dataclass
+class Turn:
+    """One handled message: the response text, the actions performed and the messages to keep as conversation history."""
+    text: str
+    actions_performed: list[str]
+    messages: list[MessageParam]
+
+def estimate_tokens(messages: list[MessageParam]) -> int:
+    """Rough token count of messages (~4 characters per token), good enough for budgeting without a tokenizer round trip."""
+    return len(json.dumps(messages, default=str)) // 4
+
+def _is_turn_start(message: MessageParam) -> bool:
+    """A turn starts with the user's prompt, as opposed to a user message carrying tool results."""
+    return message["role"] == "user" and isinstance(message["content"], str)
+
+def _compact_tool_result(block: dict) -> dict:
+    """Shorten a tool result to its first characters, keeping the tool_use_id so the history stays valid."""
+    content = block.get("content", "")
+    if not isinstance(content, str):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+    limit = constants.conversation_compacted_result_chars
+    if len(content) <= limit:
+        return block
+    return {**block, "content": content[:limit].rstrip() + " [...]"}
+
+def compact_messages(messages: list[MessageParam], keep_last: int = 1) -> tuple[list[MessageParam], int]:
+    """Shorten tool results in all but the last keep_last messages. Returns the compacted messages and how many results were shortened."""
+    compacted: list[MessageParam] = []
+    shortened = 0
+
+    for index, message in enumerate(messages):
+        content = message["content"]
+        if index >= len(messages) - keep_last or message["role"] != "user" or isinstance(content, str):
+            compacted.append(message)
+            continue
+
+        blocks = []
+        for block in content:
+            if isinstance(block, dict) and block.get("type") == "tool_result":
+                short_block = _compact_tool_result(block)
+                shortened += short_block is not block
+                block = short_block
+            blocks.append(block)
+        compacted.append(cast(MessageParam, {**message, "content": blocks}))
+
+    return compacted, shortened
+
+class ConversationStore:
+    """Recent conversation turns per user, kept within a token budget, in an LRU or, when persistence is on,
+    in SQLite shared by every worker process (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(ConversationStore, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.lock = threading.Lock()
+        self.conversations: OrderedDict[str, tuple[float, list[MessageParam]]] = OrderedDict() # user -> (updated at, messages)
+        self.compactions = 0
+        self.dropped_turns = 0
+        self.db: sqlite3.Connection | None = None
+
+        if constants.conversation_db_path:
+            os.makedirs(os.path.dirname(constants.conversation_db_path) or ".", exist_ok=True)
+            # autocommit, so appends can hold an explicit write transaction across their read and write
+            self.db = sqlite3.connect(constants.conversation_db_path, check_same_thread=False, isolation_level=None)
+            self.db.execute("CREATE TABLE IF NOT EXISTS conversations (user_id TEXT PRIMARY KEY, updated_at REAL, messages TEXT)")
+            self.db.commit()
+
+        stats.register("conversations", self.stats)
+
+    @staticmethod
+    def _user_key(user_id: Any) -> str:
+        return str(getattr(user_id, "id", user_id))
+
+    def _load(self, user_key: str) -> tuple[float, list[MessageParam]] | None:
+        """Load a conversation from the persistent store (called with the lock held)."""
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT updated_at, messages FROM conversations WHERE user_id = ?", (user_key,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _recent(self, user_key: str) -> list[MessageParam]:
+        """The user's messages, or nothing when the conversation has gone idle (called with the lock held).
+        Read from the persistent store when there is one, since other processes write to it too."""
+        conversation = self._load(user_key) if self.db is not None else self.conversations.get(user_key)
+        if not conversation or conversation[0] < time.time() - constants.conversation_idle_timeout:
+            return []
+        if self.db is None:
+            self.conversations.move_to_end(user_key)
+        return list(conversation[1])
+
+    def history(self, user_id: Any) -> list[MessageParam]:
+        """Get the messages of the user's recent turns, or nothing when the conversation has gone idle."""
+        with self.lock:
+            return self._recent(ConversationStore._user_key(user_id))
+
+    def _fit(self, messages: list[MessageParam]) -> list[MessageParam]:
+        """Bring a history within the turn limit and token budget: compact tool results first, then drop the oldest turns."""
+        turn_starts = [index for index, message in enumerate(messages) if _is_turn_start(message)]
+        if len(turn_starts) > constants.conversation_max_turns:
+            self.dropped_turns += len(turn_starts) - constants.conversation_max_turns
+            messages = messages[turn_starts[-constants.conversation_max_turns]:]
+
+        if estimate_tokens(messages) <= constants.conversation_token_budget:
+            return messages
+
+        messages, shortened = compact_messages(messages, keep_last=0)
+        if shortened:
+            self.compactions += 1
+
+        while estimate_tokens(messages) > constants.conversation_token_budget:
+            turn_starts = [index for index, message in enumerate(messages) if _is_turn_start(message)]
+            if len(turn_starts) < 2:
+                break
+            messages = messages[turn_starts[1]:]
+            self.dropped_turns += 1
+
+        return messages
+
+    def fit_request(self, messages: list[MessageParam]) -> list[MessageParam]:
+        """Compact the tool results of a request whose messages exceed the token budget (between tool rounds).
+        The compacted part grows in steps of conversation_compaction_step messages rather than every round,
+        so the prompt cache keeps matching the request's prefix in between."""
+        if estimate_tokens(messages) <= constants.conversation_token_budget:
+            return messages
+        keep_last = (len(messages) - 1) % constants.conversation_compaction_step + 1
+        compacted, shortened = compact_messages(messages, keep_last=keep_last)
+        if shortened:
+            with self.lock:
+                self.compactions += 1
+        return compacted
+
+    def append(self, user_id: Any, turn: Turn) -> None:
+        """Add a completed turn to the user's conversation."""
+        if not turn.messages:
+            return
+        user_key = ConversationStore._user_key(user_id)
+
+        with self.lock:
+            if self.db is None:
+                self.conversations[user_key] = (time.time(), self._fit(self._recent(user_key) + turn.messages))
+                self.conversations.move_to_end(user_key)
+                self._evict()
+                return
+
+            # read and write in one transaction, so turns appended by another process in between are not overwritten
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                messages = self._fit(self._recent(user_key) + turn.messages)
+                self.db.execute(
+                    "INSERT OR REPLACE INTO conversations (user_id, updated_at, messages) VALUES (?, ?, ?)",
+                    (user_key, time.time(), json.dumps(messages, default=str)),
+                )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def clear(self, user_id: Any) -> None:
+        user_key = ConversationStore._user_key(user_id)
+        with self.lock:
+            self.conversations.pop(user_key, None)
+            if self.db is not None:
+                self.db.execute("DELETE FROM conversations WHERE user_id = ?", (user_key,))
+
+    def _evict(self) -> None:
+        while len(self.conversations) > constants.conversation_max_entries:
+            self.conversations.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": self.db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] if self.db else len(self.conversations),
+                "compactions": self.compactions,
+                "dropped_turns": self.dropped_turns,
+                "persistent": self.db is not None,
+            }
@@ -1,29 +1,88 @@
-from elevenlabs import ElevenLabs
-import os
 from io import BytesIO
-from vosk import Model
-from vosk import KaldiRecognizer
+from typing import TYPE_CHECKING
 import wave
 import json
+import subprocess
+import re
+import threading
+from typing import Iterable, Iterator
 from globals import constants
+from lib.speech import get_speech_backend
+from lib.load import load_vosk_model
+from lib import tracing
 
-model = Model(constants.vosk_model_path)
+if TYPE_CHECKING:
+    from vosk import Model, KaldiRecognizer
 
-def audio_to_text(audio_fp: str) -> str:
-    """Take an audio file path and return the transcribed text using vosk."""
+model: "Model | None" = None # loaded on first use, or while starting up (see lib.startup)
+model_lock = threading.Lock()
+recognizers = threading.local() # per-thread recognizers, keyed by sample rate
 
-    wf = wave.open(audio_fp, "rb")
-    if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
-        raise ValueError("Audio file must be WAV format mono PCM.")
+def get_model() -> "Model":
+    """Get the vosk model, downloading and loading it on first use."""
+    global model
+    if model is None:
+        with model_lock:
+            if model is None:
+                from vosk import Model # the vosk library itself takes a while to load
 
-    rec = KaldiRecognizer(model, wf.getframerate())
+                load_vosk_model()
+                model = Model(constants.vosk_model_path)
+    return model
+
+def create_recognizer(sample_rate: int) -> "KaldiRecognizer":
+    from vosk import KaldiRecognizer
+    return KaldiRecognizer(get_model(), sample_rate)
+
+def get_recognizer(sample_rate: int) -> "KaldiRecognizer":
+    """Get a reset recognizer for the sample rate, reusing the one this thread created before."""
+    cache: dict[int, KaldiRecognizer] = recognizers.__dict__.setdefault("by_sample_rate", {})
+
+    if sample_rate not in cache:
+        cache[sample_rate] = create_recognizer(sample_rate)
+    else:
+        cache[sample_rate].Reset()
+
+    return cache[sample_rate]
+
+def normalize_audio(data: bytes) -> tuple[bytes, int]:
+    """Take uploaded audio bytes and return mono 16-bit PCM frames with their sample rate, without touching disk."""
+
+    # already conformant PCM WAV -> use the frames as they are
+    try:
+        with wave.open(BytesIO(data), "rb") as wf:
+            if wf.getnchannels() == 1 and wf.getsampwidth() == 2 and wf.getcomptype() == "NONE":
+                return wf.readframes(wf.getnframes()), wf.getframerate()
+    except (wave.Error, EOFError):
+        pass
+
+    # anything else -> decode through an ffmpeg pipe into raw PCM
+    result = subprocess.run(
+        [
+            "ffmpeg", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", "1", "-ar", str(constants.recognition_sample_rate),
+            "pipe:1",
+        ],
+        input=data,
+        capture_output=True,
+    )
+
+    if result.returncode != 0:
+        raise ValueError(f"Could not decode audio: {result.stderr.decode(errors='replace').strip()}")
+
+    return result.stdout, constants.recognition_sample_rate
+
+def audio_to_text(pcm: bytes, sample_rate: int) -> str:
+    """Take mono 16-bit PCM frames and return the transcribed text using vosk."""
+
+    rec = get_recognizer(sample_rate)
     results = []
 
-    while True:
-        data = wf.readframes(4000)
-        if len(data) == 0:
-            break
-        if rec.AcceptWaveform(data):
+    block_size = 4000 * 2 # 4000 frames of 16-bit samples
+    for offset in range(0, len(pcm), block_size):
+        if rec.AcceptWaveform(pcm[offset:offset + block_size]):
             res = json.loads(rec.Result())
             results.append(res.get('text', ''))
 
@@ -32,24 +91,29 @@ def audio_to_text(audio_fp: str) -> str:
 
     return ' '.join(results)
 
-def text_to_audio(text : str) -> BytesIO:
-    """Takes an input string and uses Eleven Labs API to generate speech and save it as an MP3 file.
-    Returns the name of the new MP3."""
+def text_to_audio(text: str) -> Iterator[bytes]:
+    """Takes an input string and uses the configured speech backend to generate speech, yielding audio chunks."""
+    return tracing.traced_stream("tts", get_speech_backend().stream(text))
 
-    client = ElevenLabs(
-        api_key=os.getenv("ELEVEN_LABS_API_KEY")
-    )
+def audio_mimetype() -> str:
+    """Mimetype of the audio produced by the configured speech backend."""
+    return get_speech_backend().mimetype
 
-    response = client.text_to_speech.convert(
-        voice_id="JBFqnCBsd6RMkjVDRZzb",
-        output_format="mp3_44100_128",
-        text=text,
-        model_id="eleven_multilingual_v2",
-    )
+sentence_boundary = re.compile(r"[.!?;]+[\"')\]]*\s+|\n+")
+
+def chunk_sentences(text_stream: Iterable[str]) -> Iterator[str]:
+    """Group streamed text fragments into sentence-sized chunks that can be synthesized independently."""
+    buffer = ""
+
+    for text in text_stream:
+        buffer += text
 
-    audio_buffer = BytesIO()
-    for chunk in response:  # response is a generator
-        audio_buffer.write(chunk)
+        # emit every complete sentence that is long enough to be worth a synthesis request
+        while (boundary := sentence_boundary.search(buffer, constants.tts_min_chunk_chars)):
+            chunk = buffer[:boundary.end()].strip()
+            buffer = buffer[boundary.end():]
+            if chunk:
+                yield chunk
 
-    audio_buffer.seek(0)  # reset buffer pointer to the beginning
-    return audio_buffer
\ No newline at end of file
+    if buffer.strip():
+        yield buffer.strip()
@@ -0,0 +1,71 @@
+from typing import Tuple
+import difflib
+import re
+import unicodedata
+from globals import constants
+from db.models import Place, with_connection
+
+def normalize_place_name(name: str) -> str:
+    """Lowercase, strip accents and punctuation, and collapse whitespace so spellings of a place share a key."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", ascii_name.lower()).split())
+
+class Gazetteer:
+    """Persistent geocode index backed by the Place table: exact, then whole-word prefix, then fuzzy lookups by normalized name."""
+
+    @staticmethod
+    def _best(query) -> Place | None:
+        return query.order_by(Place.population.desc()).first()
+
+    @staticmethod
+    @with_connection
+    def lookup(city: str) -> Tuple[float, float] | None:
+        """Find the most populous place matching the city name, or None when the index has no confident match.
+        A qualified name ("Paris, Texas") only matches its exact key or the bare name in the country it names (e.g. "Paris, FR")."""
+        key = normalize_place_name(city)
+        if not key:
+            return None
+
+        place = Gazetteer._best(Place.select().where(Place.key == key))
+        if place:
+            return place.lat, place.lon
+
+        name, qualified, qualifier = city.partition(",")
+        if qualified:
+            # regions are not indexed -> only country codes can be checked locally, anything else goes upstream
+            name_key, country = normalize_place_name(name), normalize_place_name(qualifier).upper()
+            if name_key and len(country) == 2:
+                place = Gazetteer._best(Place.select().where((Place.key == name_key) & (Place.country == country)))
+                if place:
+                    return place.lat, place.lon
+            return None
+
+        # longer names starting with the whole name (e.g. "new york" -> "new york city"), never a partial word
+        if len(key) >= constants.geocode_min_prefix_length:
+            place = Gazetteer._best(Place.select().where(Place.key.startswith(f"{key} ")))
+            if place:
+                return place.lat, place.lon
+
+            # fuzzy match (typos) against the most populous places sharing the first letters
+            candidates = [
+                candidate for (candidate,) in Place.select(Place.key)
+                .where(Place.key.startswith(key[:2]))
+                .order_by(Place.population.desc())
+                .limit(constants.geocode_fuzzy_candidates)
+                .tuples()
+            ]
+            matches = difflib.get_close_matches(key, candidates, n=1, cutoff=constants.geocode_fuzzy_cutoff)
+            if matches:
+                place = Gazetteer._best(Place.select().where(Place.key == matches[0]))
+                if place:
+                    return place.lat, place.lon
+
+        return None
+
+    @staticmethod
+    @with_connection
+    def remember(city: str, lat: float, lon: float) -> None:
+        """Write an upstream geocoding result back so the next lookup is served locally."""
+        key = normalize_place_name(city)
+        if key:
+            Place.create(key=key, name=city, lat=lat, lon=lon, source="nominatim")
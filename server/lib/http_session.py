@@ -0,0 +1,45 @@
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import threading
+from globals import constants
+from lib.stats import Histogram
+
+class PooledSession(requests.Session):
+    """Keep-alive session with per-host connection pools, bounded retries with jittered backoff and per-host latency histograms."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        retry = Retry(
+            total=constants.http_retries,
+            backoff_factor=constants.http_backoff_factor,
+            backoff_jitter=constants.http_backoff_jitter,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False, # hand the final response to raise_for_status
+        )
+
+        # default pools, then dedicated pools for the hosts actions talk to
+        for prefix in ("http://", "https://"):
+            self.mount(prefix, HTTPAdapter(pool_maxsize=constants.http_default_pool_size, max_retries=retry))
+        for prefix, pool_size in constants.http_pool_sizes.items():
+            self.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+
+        self.latency: dict[str, Histogram] = {}
+        self.latency_lock = threading.Lock()
+        self.hooks["response"].append(self._record_latency)
+
+    def _record_latency(self, response: requests.Response, *args, **kwargs) -> None:
+        """Record time until response headers (including retries) in the histogram of the response's host."""
+        host = urlparse(response.url).netloc
+        with self.latency_lock:
+            if host not in self.latency:
+                self.latency[host] = Histogram(constants.http_latency_buckets)
+            histogram = self.latency[host]
+        histogram.observe(response.elapsed.total_seconds())
+
+    def stats(self) -> dict:
+        with self.latency_lock:
+            histograms = dict(self.latency)
+        return {host: histogram.snapshot() for host, histogram in histograms.items()}
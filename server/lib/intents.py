@@ -0,0 +1,112 @@
+from typing import Any, Callable
+from datetime import datetime
+import re
+import threading
+from globals import constants
+from db.models import UserSettings, with_connection
+from lib.actions import Actions
+from lib.conversations import Turn
+from lib import stats
+
+# filler around a command that does not change its meaning
+leading_filler = re.compile(r"^(?:(?:hey|hi|ok|okay|so|um|uh)\s+)*(?:hem\s+)?(?:(?:can|could) you\s+)?(?:(?:please|tell me|say)\s+)*")
+trailing_filler = re.compile(r"(?:\s+(?:please|now|right now|today|again|thanks|thank you))*$")
+
+def normalize_command(text: str) -> str:
+    """Lowercase, drop punctuation and strip filler words, so only the command itself has to match."""
+    text = " ".join(re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split())
+    return trailing_filler.sub("", leading_filler.sub("", text))
+
+def spoken_time(action_result: str) -> str:
+    hour, minute = (int(part) for part in action_result.split(":")[:2])
+    return f"It's {hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}."
+
+def spoken_date(action_result: str) -> str:
+    date = datetime.strptime(action_result, "%Y-%m-%d")
+    return f"Today is {date:%A}, {date:%B} {date.day}, {date.year}."
+
+# intent -> (whole-command pattern, action, reply template over the action result)
+intents: dict[str, tuple[re.Pattern, str, Callable[[str], str]]] = {
+    "time": (
+        re.compile(r"(?:what(?:'s| is)? the (?:current )?time(?: is it)?|what time(?: is it| it is)?|(?:the |current )?time)"),
+        "get_time",
+        spoken_time,
+    ),
+    "date": (
+        re.compile(r"(?:what(?:'s| is)? (?:the |today's )?date(?: is it)?|what day is(?: it)?|(?:the |today's )?date)"),
+        "get_date",
+        spoken_date,
+    ),
+}
+
+class IntentRouter:
+    """Answers trivial, high-confidence commands by running their action directly instead of asking the llm (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(IntentRouter, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.actions = Actions()
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.hits: dict[str, int] = {intent: 0 for intent in intents}
+        self.fast_path_errors = 0 # matched commands whose action failed and went to the llm instead
+        stats.register("intents", self.stats)
+
+    @staticmethod
+    def match(user_prompt: str) -> str | None:
+        """Name of the intent the whole command matches, if any."""
+        command = normalize_command(user_prompt)
+        return next((intent for intent, (pattern, _, _) in intents.items() if pattern.fullmatch(command)), None)
+
+    @staticmethod
+    @with_connection
+    def enabled_for(user_id: Any) -> bool:
+        settings = UserSettings.get_or_none(UserSettings.user == getattr(user_id, "id", user_id))
+        return settings.fast_path if settings else True
+
+    def route(self, user_id: Any, user_prompt: str) -> Turn | None:
+        """Answer the message locally when it is a known command and the user has the fast path on, otherwise None."""
+        with self.lock:
+            self.messages += 1
+
+        if not constants.intent_fast_path:
+            return None
+
+        intent = IntentRouter.match(user_prompt)
+        if intent is None or not IntentRouter.enabled_for(user_id):
+            return None
+
+        _, action_name, reply = intents[intent]
+        try:
+            text = reply(self.actions.execute(action_name, {}))
+        except Exception:
+            with self.lock:
+                self.fast_path_errors += 1
+            return None
+
+        with self.lock:
+            self.hits[intent] += 1
+
+        return Turn(
+            text=text,
+            actions_performed=[action_name],
+            messages=[{"role": "user", "content": user_prompt}, {"role": "assistant", "content": text}],
+        )
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits = sum(self.hits.values())
+            return {
+                "messages": self.messages,
+                "hits": hits,
+                "hit_rate": hits / self.messages if self.messages else 0.0,
+                "by_intent": dict(self.hits),
+                "fast_path_errors": self.fast_path_errors,
+            }
@@ -0,0 +1,163 @@
+from typing import Any
+from uuid import uuid4
+import dataclasses
+import os
+import sqlite3
+import threading
+import time
+from globals import constants
+from lib import stats
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are already waiting for a worker."""
+
+@dataclasses.dataclass
+class Job:
+    id: str
+    user_id: str
+    audio: bytes
+    attempts: int
+
+class JobQueue:
+    """Durable queue of /respond jobs in a local SQLite file, shared by the web and worker processes (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(JobQueue, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.local = threading.local() # one sqlite connection per thread
+        self._create_schema()
+        stats.register("jobs", self.stats)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            # autocommit, with explicit transactions where a read and a write have to be atomic
+            connection = sqlite3.connect(constants.job_db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _create_schema(self) -> None:
+        os.makedirs(os.path.dirname(constants.job_db_path) or ".", exist_ok=True)
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                status TEXT NOT NULL, -- queued, running, done or failed
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                input BLOB,
+                transcription TEXT,
+                response TEXT,
+                error TEXT,
+                result BLOB,
+                mimetype TEXT
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+
+    def enqueue(self, user_id: Any, audio: bytes) -> str:
+        """Store an uploaded recording for the workers and return the job id."""
+        connection = self._connection()
+        queued = connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= constants.job_queue_size:
+            raise JobQueueFull(f"{queued} jobs are already waiting, try again later.")
+
+        job_id = str(uuid4())
+        connection.execute(
+            "INSERT INTO jobs (id, user_id, status, created_at, input) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, str(getattr(user_id, "id", user_id)), time.time(), audio),
+        )
+        return job_id
+
+    def claim(self) -> Job | None:
+        """Take the oldest queued job, marking it as running (atomic across processes)."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT id, user_id, input, attempts FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (time.time(), row[0]),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return Job(id=row[0], user_id=row[1], audio=row[2], attempts=row[3] + 1) if row else None
+
+    def finish(self, job_id: str, transcription: str, response: str, audio: bytes, mimetype: str) -> None:
+        # the recording is no longer needed once the job succeeded
+        self._connection().execute(
+            """UPDATE jobs SET status = 'done', finished_at = ?, input = NULL, transcription = ?, response = ?, result = ?, mimetype = ?
+            WHERE id = ?""",
+            (time.time(), transcription, response, audio, mimetype, job_id),
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._connection().execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, input = NULL, error = ? WHERE id = ?",
+            (time.time(), error, job_id),
+        )
+
+    def get(self, job_id: str) -> dict | None:
+        """Status of a job, without its audio."""
+        row = self._connection().execute(
+            "SELECT id, user_id, status, attempts, created_at, started_at, finished_at, transcription, response, error FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "user_id", "status", "attempts", "created_at", "started_at", "finished_at", "transcription", "response", "error"), row))
+
+    def wait(self, job_id: str, timeout: float) -> dict | None:
+        """Long-poll: return the job once it is done or failed, or its current state when the timeout runs out."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in ("done", "failed") or time.monotonic() >= deadline:
+                return job
+            time.sleep(min(constants.job_poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def result(self, job_id: str) -> tuple[bytes, str] | None:
+        """Audio and mimetype of a finished job."""
+        row = self._connection().execute("SELECT result, mimetype FROM jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def recover(self) -> None:
+        """Requeue jobs whose worker died mid-run (failing them after too many attempts) and drop old finished jobs."""
+        connection = self._connection()
+        now = time.time()
+        stale_before = now - constants.job_timeout
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, input = NULL, error = 'Job timed out.' WHERE status = 'running' AND started_at < ? AND attempts >= ?",
+                (now, stale_before, constants.job_max_attempts),
+            )
+            connection.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND started_at < ?", (stale_before,))
+            connection.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (now - constants.job_retention,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> dict:
+        counts = dict(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ("queued", "running", "done", "failed")}
@@ -1,8 +1,9 @@
 from dotenv import load_dotenv
 import os
+import shutil
+import tempfile
 import urllib.request
 import zipfile
-from vosk import Model
 from globals import constants
 
 def preflight():
@@ -29,16 +30,30 @@ def preflight():
         exit(1)
 
 def load_vosk_model():
-    """Load the Vosk model if it exists."""
-
-    if not os.path.exists(constants.vosk_model_path):
-        print(f"Vosk model not found at {constants.vosk_model_path}. Downloading...")
-        os.makedirs(constants.vosk_model_path, exist_ok=True)
-        url = "https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip"
-        model_zip_path = "/tmp/vosk-model.zip"
+    """Download the Vosk model if it does not exist yet.
+    Extracted into a temporary directory and renamed into place, so a concurrent or interrupted download
+    never leaves a partial model at the model path."""
+
+    if os.path.exists(constants.vosk_model_path):
+        return
+
+    print(f"Vosk model not found at {constants.vosk_model_path}. Downloading...")
+    parent = os.path.dirname(constants.vosk_model_path) or "."
+    os.makedirs(parent, exist_ok=True)
+    url = "https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip"
+    download_dir = tempfile.mkdtemp(prefix=".vosk-download-", dir=parent)
+    try:
+        model_zip_path = os.path.join(download_dir, "model.zip")
         urllib.request.urlretrieve(url, model_zip_path)
-        
-        with zipfile.ZipFile(model_zip_path, 'r') as zip_ref:
-            zip_ref.extractall(os.path.dirname(constants.vosk_model_path))
 
-        
+        with zipfile.ZipFile(model_zip_path, 'r') as zip_ref:
+            zip_ref.extractall(download_dir)
+
+        try:
+            os.rename(os.path.join(download_dir, constants.vosk_model_identifier), constants.vosk_model_path)
+        except OSError:
+            # another process finished first -> keep its copy
+            if not os.path.exists(constants.vosk_model_path):
+                raise
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
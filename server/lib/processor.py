@@ -1,13 +1,27 @@
-from typing import cast
-from anthropic.types import MessageParam
+from functools import cached_property
+from typing import cast, Iterator
+import contextvars
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from anthropic.types import MessageParam, Message, ToolParam, ToolUseBlock, ToolResultBlockParam
 import anthropic
 from globals import constants
 from lib.actions import Actions
+from lib.conversations import ConversationStore, Turn
+from lib.intents import IntentRouter
+from lib.tool_selection import ToolSelector
 from lib.prompts import Prompts
-from db.utils import get_user_macros
+from lib.usage import RequestUsage, UsageTracker
+from lib import tracing
 
 actions = Actions() # initialize the Actions class (singleton)
 prompts = Prompts() 
+usage_tracker = UsageTracker() # initialize the UsageTracker class (singleton)
+conversations = ConversationStore() # initialize the ConversationStore class (singleton)
+intent_router = IntentRouter() # initialize the IntentRouter class (singleton)
+tool_selector = ToolSelector() # initialize the ToolSelector class (singleton)
+action_executor = ThreadPoolExecutor(max_workers=constants.action_workers) # runs the tool calls of a model turn concurrently
 
 class Processor:
     """Compilation Mode: Speak and let anthropic compile your thoughts into actions."""
@@ -22,7 +36,11 @@ class Processor:
         if hasattr(self, "_initialized") and self._initialized:
             return
         self._initialized = True
-        self.client = anthropic.Anthropic()
+
+    @cached_property
+    def client(self) -> anthropic.Anthropic:
+        """Created on first use, or while starting up (see lib.startup)."""
+        return anthropic.Anthropic()
 
     @staticmethod
     def _remove_enclosed_tag_data(text: str, tag: str) -> str:
@@ -35,58 +53,300 @@ class Processor:
             text = text[:start_index] + text[end_index:]
         return text
 
+    @staticmethod
+    def _execute_tools(tool_blocks: list[ToolUseBlock]) -> list[ToolResultBlockParam]:
+        """Execute every requested tool concurrently, returning one tool result per block in request order.
+        Each action gets the action timeout from the moment it starts, actions still queued that long are cancelled."""
+        submitted_at = time.monotonic()
+        started_at: list[float | None] = [None] * len(tool_blocks)
+
+        def run(index: int, tool_block: ToolUseBlock) -> str:
+            started_at[index] = time.monotonic()
+            return actions.execute(tool_block.name, cast(dict, tool_block.input))
+
+        futures = [
+            # a copied context lets the action's span report to the request's trace
+            action_executor.submit(contextvars.copy_context().run, run, index, tool_block)
+            for index, tool_block in enumerate(tool_blocks)
+        ]
+
+        pending = set(range(len(futures)))
+        timed_out: set[int] = set()
+        while pending:
+            now = time.monotonic()
+            deadlines = []
+            for index in list(pending):
+                if futures[index].done():
+                    pending.discard(index)
+                    continue
+
+                deadline = (started_at[index] or submitted_at) + constants.action_timeout
+                if now < deadline:
+                    deadlines.append(deadline)
+                elif started_at[index] is None and not futures[index].cancel():
+                    deadlines.append(now + constants.action_timeout) # started just now
+                else:
+                    pending.discard(index)
+                    timed_out.add(index)
+
+            if deadlines:
+                wait([futures[index] for index in pending], timeout=min(deadlines) - now, return_when=FIRST_COMPLETED)
+
+        tool_results: list[ToolResultBlockParam] = []
+        for index, (tool_block, future) in enumerate(zip(tool_blocks, futures)):
+            tool_result = ToolResultBlockParam(type="tool_result", tool_use_id=tool_block.id)
+
+            if future.cancelled():
+                tool_result.update(content=f"Action did not start within {constants.action_timeout} seconds, the server is busy.", is_error=True)
+            elif index in timed_out:
+                tool_result.update(content=f"Action timed out after {constants.action_timeout} seconds.", is_error=True)
+            elif future.exception():
+                tool_result.update(content=str(future.exception()), is_error=True)
+            else:
+                tool_result.update(content=future.result())
+
+            tool_results.append(tool_result)
+
+        return tool_results
+
+    @staticmethod
+    def _assistant_message(response: Message) -> MessageParam:
+        """Rebuild the model's turn as an assistant message, keeping text and tool use blocks in the order they were produced."""
+        previous_message = {"role": "assistant", "content": []}
+
+        for item in response.content:
+            if item.type == "text":
+                previous_message["content"].append({"type": "text", "text": item.text})
+            elif item.type == "tool_use":
+                previous_message["content"].append({
+                    "type": "tool_use",
+                    "id": item.id,
+                    "name": item.name,
+                    "input": item.input
+                })
+
+        return cast(MessageParam, previous_message)
+
+    @staticmethod
+    def _tool_round(response: Message, tool_blocks: list[ToolUseBlock]) -> list[MessageParam]:
+        """Execute the requested tools and return the assistant/tool result messages to append to the conversation."""
+        # all tool results go back in a single user message
+        action_result_message = cast(MessageParam, {"role": "user", "content": Processor._execute_tools(tool_blocks)})
+
+        return [Processor._assistant_message(response), action_result_message]
+
+    @staticmethod
+    def _cacheable_tools(tools: list[ToolParam]) -> list[ToolParam]:
+        """Mark the end of the tool definitions as a prompt cache breakpoint."""
+        if not tools:
+            return tools
+        return [*tools[:-1], cast(ToolParam, {**tools[-1], "cache_control": {"type": "ephemeral"}})]
+
+    @staticmethod
+    def _cacheable_messages(messages: list[MessageParam]) -> list[MessageParam]:
+        """Mark the end of the conversation as a prompt cache breakpoint once tool rounds make it worth reusing."""
+        if len(messages) < 2:
+            return messages
+
+        last_message = messages[-1]
+        content = last_message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+
+        content = [*content[:-1], {**content[-1], "cache_control": {"type": "ephemeral"}}]
+        return [*messages[:-1], cast(MessageParam, {**last_message, "content": content})]
+
+    @staticmethod
+    def _tool_options(tools: list[ToolParam], tool_round: int) -> dict:
+        """Offer the tools, but make the model answer without them once the tool round limit is reached."""
+        if not tools:
+            return {}
+        if tool_round < constants.max_tool_rounds:
+            return {"tools": tools}
+        return {"tools": tools, "tool_choice": {"type": "none"}}
+
+    @staticmethod
+    def _finish_turn(messages: list[MessageParam], text: str, actions_performed: list[str]) -> Turn:
+        """Close a turn with the final response, keeping it as history only if the model answered with text."""
+        if not text:
+            return Turn(text=text, actions_performed=actions_performed, messages=[])
+        return Turn(text=text, actions_performed=actions_performed, messages=[*messages, {"role": "assistant", "content": text}])
+
+    def complete(self, user_id: str, user_prompt: str, speculative: bool = False) -> Turn | None:
+        """Responds to a message on top of the user's conversation history, without adding the turn to it.
+        A speculative response is a single llm round that runs no actions: None when the model asks for tools."""
+        # simple commands -> answered without the llm (speculation leaves them to the real response)
+        if speculative:
+            if IntentRouter.match(user_prompt):
+                return None
+            fast_turn = None
+        else:
+            fast_turn = intent_router.route(user_id, user_prompt)
+        if fast_turn:
+            return fast_turn
+
+        history = conversations.history(user_id)
+        messages: list[MessageParam] = [
+            {"role": "user", "content": user_prompt}
+        ]
+
+        actions_performed: list[str] = []
+        request_usage = RequestUsage()
+
+        # load macros and generate system prompt (cached until the user's macros change)
+        compiled_prompt = prompts.get_user_prompt(user_id)
+        system_prompt = compiled_prompt.system_blocks
+        tools = Processor._cacheable_tools(tool_selector.select(compiled_prompt.macros, user_prompt, history))
+
+        for tool_round in itertools.count():
+            with tracing.span("llm"):
+                response = self.client.messages.create(
+                    model=constants.model,
+                    max_tokens=constants.max_tokens,
+                    system=system_prompt,
+                    messages=Processor._cacheable_messages(conversations.fit_request(history + messages)),
+                    **Processor._tool_options(tools, tool_round),
+                )
+            request_usage.add(response.usage)
+
+            text_block = next((item for item in response.content if item.type == "text"), None)
+            tool_blocks = [item for item in response.content if item.type == "tool_use"]
+
+            # speculative and tools requested -> leave it to the real response, the transcript may still change
+            if tool_blocks and speculative:
+                usage_tracker.record(user_id, request_usage)
+                return None
+
+            # requested tool use -> use tools and append results to messages
+            if tool_blocks and tool_round < constants.max_tool_rounds:
+                actions_performed.extend(tool_block.name for tool_block in tool_blocks)
+                messages.extend(Processor._tool_round(response, tool_blocks))
+
+            # no tool use -> return llm final response
+            else:
+                usage_tracker.record(user_id, request_usage)
+                text = Processor._remove_enclosed_tag_data(text_block.text, "input_analysis") if text_block else ""
+                return Processor._finish_turn(messages, text, actions_performed)
+
     def handle_message(self, user_id: str, user_prompt: str) -> tuple[str, list[str]]:
         """Handles an incoming message from a specific user and returns a text response and a list of actions performed."""
+        turn = self.complete(user_id, user_prompt)
+        conversations.append(user_id, turn)
+        return turn.text, turn.actions_performed
+
+    def stream_message(self, user_id: str, user_prompt: str) -> Iterator[str]:
+        """Handles an incoming message like `handle_message`, but yields response text as the model generates it.
+        Tool rounds are executed as they are requested; text emitted alongside a tool call is yielded as well."""
+        # simple commands -> answered without the llm
+        fast_turn = intent_router.route(user_id, user_prompt)
+        if fast_turn:
+            conversations.append(user_id, fast_turn)
+            yield fast_turn.text
+            return
+
+        history = conversations.history(user_id)
         messages: list[MessageParam] = [
             {"role": "user", "content": user_prompt}
         ]
 
         actions_performed: list[str] = []
+        request_usage = RequestUsage()
+        spoken_text = "" # text yielded over every round of the turn
 
-        # load macros and generate system prompt
-        macros = get_user_macros(user_id)
-        system_prompt = prompts.get_system_prompt(macros)
+        # load macros and generate system prompt (cached until the user's macros change)
+        compiled_prompt = prompts.get_user_prompt(user_id)
+        system_prompt = compiled_prompt.system_blocks
+        tools = Processor._cacheable_tools(tool_selector.select(compiled_prompt.macros, user_prompt, history))
 
-        while True:
-            response = self.client.messages.create(
+        for tool_round in itertools.count():
+            tag_filter = EnclosedTagFilter("input_analysis")
+            round_text = ""
+            started_at, first_text = time.perf_counter(), True
+
+            with self.client.messages.stream(
                 model=constants.model,
                 max_tokens=constants.max_tokens,
                 system=system_prompt,
-                messages=messages,
-                tools=actions.action_schemas,
-            )
+                messages=Processor._cacheable_messages(conversations.fit_request(history + messages)),
+                **Processor._tool_options(tools, tool_round),
+            ) as stream:
+                for text in stream.text_stream:
+                    if first_text:
+                        # the rest of the stream is paced by the consumer, so only time to first text is meaningful
+                        first_text = False
+                        tracing.record("llm_first_text", time.perf_counter() - started_at)
+                    visible_text = tag_filter.feed(text)
+                    if visible_text:
+                        round_text += visible_text
+                        yield visible_text
+                response = stream.get_final_message()
+            request_usage.add(response.usage)
 
-            text_block = next((item for item in response.content if item.type == "text"), None)
-            tool_block = next((item for item in response.content if item.type == "tool_use"), None)
+            remaining_text = tag_filter.flush()
+            if remaining_text:
+                round_text += remaining_text
+                yield remaining_text
+            spoken_text += round_text
 
-            # requested tool use -> use tool and append result to messages
-            if tool_block:
-                actions_performed.append(tool_block.name)
-                try:
-                    action_result = actions.execute(tool_block.name, cast(dict, tool_block.input))
-                except Exception as e:
-                    action_result = {"error": str(e)}
+            tool_blocks = [item for item in response.content if item.type == "tool_use"]
 
-                previous_message = {"role": "assistant", "content": []}
+            # no tool use -> llm final response has been fully streamed
+            if not tool_blocks or tool_round >= constants.max_tool_rounds:
+                usage_tracker.record(user_id, request_usage)
+                # the earlier rounds are in messages; a last round without text is closed with what was said before it
+                final_text = round_text.strip() or spoken_text.strip()
+                conversations.append(user_id, Processor._finish_turn(messages, final_text, actions_performed))
+                return
 
-                # text block is preset -> append to previous message
-                if text_block:
-                    previous_message["content"].append({"type": "text", "text": text_block.text})
+            actions_performed.extend(tool_block.name for tool_block in tool_blocks)
+            messages.extend(Processor._tool_round(response, tool_blocks))
 
-                # append tool use to previous message
-                previous_message["content"].append({
-                    "type": "tool_use",
-                    "id": tool_block.id,
-                    "name": tool_block.name,
-                    "input": tool_block.input
-                })
+class EnclosedTagFilter:
+    """Incrementally removes data enclosed in a tag from text that arrives in arbitrary fragments."""
+
+    def __init__(self, tag: str) -> None:
+        self.start_tag = f"<{tag}>"
+        self.end_tag = f"</{tag}>"
+        self.buffer = ""
+        self.inside = False
 
-                messages.append(cast(MessageParam, previous_message))
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """Length of the longest suffix of text that is a prefix of tag."""
+        for length in range(min(len(text), len(tag) - 1), 0, -1):
+            if text.endswith(tag[:length]):
+                return length
+        return 0
 
-                action_result_message = cast(MessageParam, {"role": "user", "content": [{ "type": "tool_result", "tool_use_id": tool_block.id, "content": action_result }]})
+    def feed(self, text: str) -> str:
+        """Consume a fragment and return the text that is known to be outside of the tag."""
+        self.buffer += text
+        output = ""
 
-                messages.append(action_result_message)
-                
-            # no tool use -> return llm final response
+        while True:
+            if self.inside:
+                end_index = self.buffer.find(self.end_tag)
+                if end_index == -1:
+                    # only keep what could be the start of a split end tag
+                    self.buffer = self.buffer[len(self.buffer) - EnclosedTagFilter._partial_tag_length(self.buffer, self.end_tag):]
+                    return output
+                self.buffer = self.buffer[end_index + len(self.end_tag):]
+                self.inside = False
             else:
-                return (Processor._remove_enclosed_tag_data(text_block.text, "input_analysis") if text_block else "", actions_performed)
\ No newline at end of file
+                start_index = self.buffer.find(self.start_tag)
+                if start_index == -1:
+                    # hold back what could be the start of a split start tag
+                    split_index = len(self.buffer) - EnclosedTagFilter._partial_tag_length(self.buffer, self.start_tag)
+                    output += self.buffer[:split_index]
+                    self.buffer = self.buffer[split_index:]
+                    return output
+                output += self.buffer[:start_index]
+                self.buffer = self.buffer[start_index + len(self.start_tag):]
+                self.inside = True
+
+    def flush(self) -> str:
+        """Return any held back text once the stream has ended."""
+        output = "" if self.inside else self.buffer
+        self.buffer = ""
+        self.inside = False
+        return output
@@ -1,9 +1,26 @@
+from collections import OrderedDict
+from anthropic.types import TextBlockParam
 from globals import constants
-from db.utils import Macro
+from db.utils import Macro, get_user_macros
+import dataclasses
 import os
+import threading
+import time
+
+@dataclasses.dataclass
+class CompiledPrompt:
+    macros: list[Macro] | None
+    system_prompt: str
+    system_blocks: list[TextBlockParam]
+    version: int
+    expires_at: float
 
 class Prompts:
     _prompt_cache = {}
+    _user_prompt_cache: OrderedDict[str, CompiledPrompt] = OrderedDict()
+    _macro_versions: dict[str, int] = {} # bumped when a user's macros change while their prompt is compiling
+    _user_prompt_building: dict[str, int] = {} # compilations in flight per user
+    _user_prompt_lock = threading.Lock()
 
     @staticmethod
     def _get_prompt(prompt_name: str):
@@ -23,18 +40,113 @@ class Prompts:
             Prompts._prompt_cache[prompt_name] = prompt_content
             return prompt_content
 
+    @staticmethod
+    def _get_system_template() -> tuple[str, str]:
+        """Get the system prompt split around the macros placeholder, so it only has to be searched once."""
+        if "system:split" not in Prompts._prompt_cache:
+            head, _, tail = Prompts._get_prompt("system").partition("{{USER_MACROS}}")
+            Prompts._prompt_cache["system:split"] = (head, tail)
+        return Prompts._prompt_cache["system:split"]
+
+    @staticmethod
+    def format_macros(macros: list[Macro] | None) -> str:
+        """Format a user's macros for the macros block of the system prompt."""
+        return "".join(
+            f"\n[{macro.name}]\nPrompt: {macro.prompt}\nRequired Tools: {', '.join(macro.required_actions)}\nAllow Other Tools: {macro.allow_other_actions}\n"
+            for macro in macros or []
+        )
+
     @staticmethod
     def get_system_prompt(macros: list[Macro] | None) -> str:
         """Get the system prompt with the narrative and temperaments."""
-        formatted_macros = ""
+        head, tail = Prompts._get_system_template()
+        return head + Prompts.format_macros(macros) + tail
+
+    @staticmethod
+    def get_system_blocks(macros: list[Macro] | None) -> list[TextBlockParam]:
+        """Get the system prompt as cacheable blocks: the static template prefix shared by every user, then the user's macros."""
+        head, tail = Prompts._get_system_template()
+        return [
+            TextBlockParam(type="text", text=head, cache_control={"type": "ephemeral"}),
+            TextBlockParam(type="text", text=Prompts.format_macros(macros) + tail, cache_control={"type": "ephemeral"}),
+        ]
+
+    @staticmethod
+    def _user_key(user_id) -> str:
+        return str(getattr(user_id, "id", user_id))
+
+    @staticmethod
+    def get_user_prompt(user_id) -> CompiledPrompt:
+        """Get a user's macros and compiled system prompt, only loading and compiling them when their macros changed."""
+        user_key = Prompts._user_key(user_id)
+
+        with Prompts._user_prompt_lock:
+            version = Prompts._macro_versions.get(user_key, 0)
+            compiled = Prompts._user_prompt_cache.get(user_key)
+            if compiled and compiled.version == version and compiled.expires_at > time.monotonic():
+                Prompts._user_prompt_cache.move_to_end(user_key)
+                return compiled
+            Prompts._user_prompt_building[user_key] = Prompts._user_prompt_building.get(user_key, 0) + 1
 
-        # format macros
-        if macros and len(macros) > 0:
-            for macro in macros:
-                formatted_macro = f"[{macro.name}]\nPrompt: {macro.prompt}\nRequired Tools: {', '.join(macro.required_actions)}\nAllow Other Tools: {macro.allow_other_actions}"
-                formatted_macros += f"\n{formatted_macro}\n"
+        try:
+            macros = get_user_macros(user_id)
+            compiled = CompiledPrompt(
+                macros=macros,
+                system_prompt=Prompts.get_system_prompt(macros),
+                system_blocks=Prompts.get_system_blocks(macros),
+                version=version,
+                expires_at=time.monotonic() + constants.user_prompt_cache_ttl,
+            )
+        except BaseException:
+            with Prompts._user_prompt_lock:
+                Prompts._finish_build(user_key)
+            raise
 
-        return Prompts._get_prompt("system").replace("{{USER_MACROS}}", formatted_macros)
+        with Prompts._user_prompt_lock:
+            # macros changed while compiling -> leave the stale result out of the cache
+            if Prompts._macro_versions.get(user_key, 0) == version:
+                Prompts._user_prompt_cache[user_key] = compiled
+                Prompts._user_prompt_cache.move_to_end(user_key)
+                while len(Prompts._user_prompt_cache) > constants.user_prompt_cache_max_entries:
+                    Prompts._forget(Prompts._user_prompt_cache.popitem(last=False)[0])
+            Prompts._finish_build(user_key)
+
+        return compiled
+
+    @staticmethod
+    def _finish_build(user_key: str) -> None:
+        Prompts._user_prompt_building[user_key] -= 1
+        if not Prompts._user_prompt_building[user_key]:
+            del Prompts._user_prompt_building[user_key]
+            Prompts._forget(user_key)
+
+    @staticmethod
+    def _forget(user_key: str) -> None:
+        """Drop the version of a user whose prompt is neither cached nor compiling, so versions stay as small as the cache."""
+        if user_key not in Prompts._user_prompt_cache and user_key not in Prompts._user_prompt_building:
+            Prompts._macro_versions.pop(user_key, None)
+
+    @staticmethod
+    def _invalidate(user_key: str) -> None:
+        # a compilation in flight must see the bump; otherwise there is nothing left to compare against
+        Prompts._user_prompt_cache.pop(user_key, None)
+        if user_key in Prompts._user_prompt_building:
+            Prompts._macro_versions[user_key] = Prompts._macro_versions.get(user_key, 0) + 1
+        else:
+            Prompts._macro_versions.pop(user_key, None)
+
+    @staticmethod
+    def invalidate_user(user_id) -> None:
+        """Mark a user's compiled prompt as stale after their macros changed."""
+        with Prompts._user_prompt_lock:
+            Prompts._invalidate(Prompts._user_key(user_id))
+
+    @staticmethod
+    def invalidate_all() -> None:
+        """Mark every compiled prompt as stale, e.g. after an action their macros may name changed."""
+        with Prompts._user_prompt_lock:
+            for user_key in dict.fromkeys([*Prompts._user_prompt_cache, *Prompts._user_prompt_building]):
+                Prompts._invalidate(user_key)
     
     @staticmethod
     def get_prompt(name: str, *args) -> str:
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable
+from uuid import uuid4
+import json
+import threading
+import time
+from globals import constants
+from lib.conversions import create_recognizer
+
+type Responder = Callable[[str], Any]
+
+speculation_executor = ThreadPoolExecutor(max_workers=constants.recognition_speculation_workers)
+
+class RecognitionSession:
+    """Feeds PCM frames into a dedicated recognizer as they arrive and, once the user seems done, speculatively responds."""
+
+    def __init__(self, user: Any, sample_rate: int, respond: Responder, speculate: Responder | None = None) -> None:
+        self.id = str(uuid4())
+        self.user = user
+        self.sample_rate = sample_rate
+        self.respond = respond
+        self.speculate = speculate # single llm call without actions, None when the model wants tools
+        self.recognizer = create_recognizer(sample_rate)
+        self.segments: list[str] = []
+        self.pending = b"" # trailing odd byte of a 16-bit sample split across chunks
+        self.speculation: tuple[str, Future] | None = None
+        self.last_active = time.monotonic()
+        self.last_speech = self.last_active
+        self.lock = threading.Lock()
+
+    @property
+    def transcript(self) -> str:
+        return " ".join(self.segments)
+
+    def _maybe_speculate(self) -> None:
+        """Respond to the transcript once after a pause, in case the user has finished speaking."""
+        if not constants.recognition_speculative_responses or not self.speculate or self.speculation or not self.segments:
+            return
+        if time.monotonic() - self.last_speech < constants.recognition_speculation_silence:
+            return
+        transcript = self.transcript
+        self.speculation = (transcript, speculation_executor.submit(self.speculate, transcript))
+
+    def accept(self, frames: bytes) -> dict:
+        """Feed 16-bit mono PCM frames and return the current partial or final hypothesis."""
+        with self.lock:
+            self.last_active = time.monotonic()
+            frames = self.pending + frames
+            split_index = len(frames) - len(frames) % 2
+            frames, self.pending = frames[:split_index], frames[split_index:]
+
+            # recognizer detected the end of an utterance -> final result for this segment
+            if self.recognizer.AcceptWaveform(frames):
+                text = json.loads(self.recognizer.Result()).get("text", "")
+                if text:
+                    self.segments.append(text)
+                    self.last_speech = self.last_active
+                return {"final": text, "transcript": self.transcript}
+
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            if partial:
+                self.last_speech = self.last_active
+            else:
+                self._maybe_speculate()
+            return {"partial": partial, "transcript": self.transcript}
+
+    def finish(self) -> tuple[str, Any]:
+        """Flush the recognizer and return the full transcript with its response, reusing a matching speculative one."""
+        with self.lock:
+            text = json.loads(self.recognizer.FinalResult()).get("text", "")
+            if text:
+                self.segments.append(text)
+            transcript = self.transcript
+            speculation = self.speculation
+
+        # the llm is called outside the lock
+        if speculation and speculation[0] == transcript:
+            turn = speculation[1].result()
+            if turn is not None:
+                return transcript, turn
+        elif speculation:
+            speculation[1].cancel()
+
+        return transcript, self.respond(transcript)
+
+class RecognitionSessions:
+    """Registry of in-flight recognition sessions (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(RecognitionSessions, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "sessions"):
+            return
+        self.sessions: dict[str, RecognitionSession] = {}
+        self.lock = threading.Lock()
+
+    def _prune(self) -> None:
+        """Drop sessions that have been idle for longer than the session timeout."""
+        cutoff = time.monotonic() - constants.recognition_session_timeout
+        for session_id in [sid for sid, s in self.sessions.items() if s.last_active < cutoff]:
+            del self.sessions[session_id]
+
+    def create(self, user: Any, sample_rate: int, respond: Responder, speculate: Responder | None = None) -> RecognitionSession:
+        session = RecognitionSession(user, sample_rate, respond, speculate)
+        with self.lock:
+            self._prune()
+            self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> RecognitionSession | None:
+        with self.lock:
+            self._prune()
+            return self.sessions.get(session_id)
+
+    def pop(self, session_id: str) -> RecognitionSession | None:
+        with self.lock:
+            self._prune()
+            return self.sessions.pop(session_id, None)
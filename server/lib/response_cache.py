@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from typing import Callable
+import dataclasses
+import hashlib
+import threading
+import time
+from globals import constants
+from lib import stats
+
+@dataclasses.dataclass
+class CachedPayload:
+    body: bytes
+    etag: str # hash of the body, so a rebuild with unchanged content keeps its etag
+    version: int
+    expires_at: float
+
+class ResponseCache:
+    """Serialized payloads of read-mostly endpoints, rebuilt only after they were invalidated or expired (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(ResponseCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.payloads: OrderedDict[str, CachedPayload] = OrderedDict()
+        self.versions: dict[str, int] = {} # bumped whenever the data behind a cached or building key changes
+        self.building: dict[str, int] = {} # builds in flight per key
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        stats.register("response_cache", self.stats)
+
+    def get(self, key: str, build: Callable[[], bytes]) -> CachedPayload:
+        """Get the payload for key, serializing it with build when it is missing, stale or expired."""
+        with self.lock:
+            version = self.versions.get(key, 0)
+            payload = self.payloads.get(key)
+            if payload and payload.version == version and payload.expires_at > time.monotonic():
+                self.payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.builds += 1
+            self.building[key] = self.building.get(key, 0) + 1
+
+        try:
+            body = build()
+            payload = CachedPayload(
+                body=body,
+                etag=hashlib.sha1(body).hexdigest(),
+                version=version,
+                expires_at=time.monotonic() + constants.response_cache_ttl,
+            )
+        except BaseException:
+            with self.lock:
+                self._finish_build(key)
+            raise
+
+        with self.lock:
+            # invalidated while building -> leave the stale payload out of the cache
+            if self.versions.get(key, 0) == version:
+                self.payloads[key] = payload
+                self.payloads.move_to_end(key)
+                while len(self.payloads) > constants.response_cache_max_entries:
+                    self._forget(self.payloads.popitem(last=False)[0])
+            self._finish_build(key)
+
+        return payload
+
+    def _finish_build(self, key: str) -> None:
+        self.building[key] -= 1
+        if not self.building[key]:
+            del self.building[key]
+            self._forget(key)
+
+    def _forget(self, key: str) -> None:
+        """Drop the version of a key that is neither cached nor building, so versions stay as small as the cache."""
+        if key not in self.payloads and key not in self.building:
+            self.versions.pop(key, None)
+
+    def invalidate(self, key: str) -> None:
+        with self.lock:
+            self.payloads.pop(key, None)
+            # a build in flight must see the bump; otherwise there is nothing left to compare against
+            if key in self.building:
+                self.versions[key] = self.versions.get(key, 0) + 1
+            else:
+                self.versions.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        """Invalidate every key starting with prefix (e.g. all users' macro listings after an action changed)."""
+        with self.lock:
+            keys = [key for key in (*self.payloads, *self.building) if key.startswith(prefix)]
+        for key in keys:
+            self.invalidate(key)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.payloads), "hits": self.hits, "builds": self.builds}
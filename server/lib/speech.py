@@ -0,0 +1,197 @@
+from typing import Iterator
+import os
+import queue
+import subprocess
+import threading
+import time
+from globals import constants
+from lib.speech_cache import SpeechCache
+
+speech_cache = SpeechCache() # initialize the SpeechCache class (singleton)
+
+class SpeechBackend:
+    """Text to speech engine that synthesizes MP3 audio as a stream of chunks."""
+    name = "base"
+    mimetype = "audio/mpeg"
+    voice_id = ""
+    model_id = ""
+    output_format = ""
+    cacheable = True
+
+    def synthesize(self, text: str) -> Iterator[bytes]:
+        """Synthesize the text, yielding audio chunks as they become available."""
+        raise NotImplementedError
+
+    def stream(self, text: str) -> Iterator[bytes]:
+        """Synthesize the text, serving previously synthesized phrases from the speech cache."""
+        if not self.cacheable:
+            yield from self.synthesize(text)
+            return
+
+        cache_key = speech_cache.key(text, self.voice_id, self.model_id, self.output_format)
+
+        cached_audio = speech_cache.get(cache_key)
+        if cached_audio is not None:
+            yield cached_audio
+            return
+
+        chunks: list[bytes] = []
+        for chunk in self.synthesize(text):
+            chunks.append(chunk)
+            yield chunk
+
+        # only fully synthesized audio is cached
+        speech_cache.put(cache_key, b"".join(chunks))
+
+class ElevenLabsBackend(SpeechBackend):
+    """Remote synthesis through the Eleven Labs API."""
+    name = "elevenlabs"
+    voice_id = constants.tts_voice_id
+    model_id = constants.tts_model_id
+    output_format = constants.tts_output_format
+
+    def __init__(self) -> None:
+        from elevenlabs import ElevenLabs, ElevenLabsEnvironment # slow to import, only needed with this backend
+
+        self.client = ElevenLabs(
+            api_key=os.getenv("ELEVEN_LABS_API_KEY"),
+            # base_url would drop the scheme and port, an environment keeps them (e.g. for a local stand-in)
+            environment=ElevenLabsEnvironment(
+                base=constants.eleven_labs_base_url,
+                wss=constants.eleven_labs_base_url.replace("http", "ws", 1),
+            ),
+        )
+
+    def synthesize(self, text: str) -> Iterator[bytes]:
+        response = self.client.text_to_speech.convert(
+            voice_id=self.voice_id,
+            output_format=self.output_format,
+            text=text,
+            model_id=self.model_id,
+        )
+        yield from response  # response is a generator
+
+class LocalBackend(SpeechBackend):
+    """Offline synthesis with espeak-ng, encoded to MP3 by ffmpeg so it can be mixed with remote audio."""
+    name = "local"
+    voice_id = constants.local_tts_voice
+    model_id = "espeak-ng"
+    output_format = "mp3_22050_64"
+
+    def synthesize(self, text: str) -> Iterator[bytes]:
+        speech = subprocess.Popen(
+            ["espeak-ng", "-v", self.voice_id, "--stdout", text],
+            stdout=subprocess.PIPE,
+        )
+        encoder = subprocess.Popen(
+            ["ffmpeg", "-loglevel", "error", "-f", "wav", "-i", "pipe:0", "-f", "mp3", "-b:a", "64k", "pipe:1"],
+            stdin=speech.stdout,
+            stdout=subprocess.PIPE,
+        )
+        speech.stdout.close() # let espeak-ng receive SIGPIPE if ffmpeg exits early
+
+        try:
+            while chunk := encoder.stdout.read(constants.tts_chunk_bytes):
+                yield chunk
+        finally:
+            encoder.stdout.close()
+            encoder.wait()
+            speech.wait()
+
+        if encoder.returncode != 0:
+            raise RuntimeError(f"Local speech synthesis failed with exit code {encoder.returncode}.")
+
+class FakeBackend(SpeechBackend):
+    """Deterministic stand-in for benchmarking: silent MP3 frames after a fixed latency, with duration proportional to the text."""
+    name = "fake"
+    cacheable = False
+
+    # MPEG-1 layer III, 128 kbps, 44.1 kHz, mono frame of silence (1152 samples)
+    frame = bytes([0xFF, 0xFB, 0x90, 0xC4]) + bytes(413)
+    frame_seconds = 1152 / 44100
+
+    def synthesize(self, text: str) -> Iterator[bytes]:
+        time.sleep(constants.fake_tts_latency)
+
+        frame_count = max(1, round(len(text) * constants.fake_tts_seconds_per_char / FakeBackend.frame_seconds))
+        frames_per_chunk = max(1, constants.tts_chunk_bytes // len(FakeBackend.frame))
+
+        for offset in range(0, frame_count, frames_per_chunk):
+            yield FakeBackend.frame * min(frames_per_chunk, frame_count - offset)
+
+class FallbackBackend(SpeechBackend):
+    """Uses the primary backend, switching to the fallback backend when the primary fails or is slow to produce its first chunk."""
+
+    def __init__(self, primary: SpeechBackend, fallback: SpeechBackend) -> None:
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def stream(self, text: str) -> Iterator[bytes]:
+        chunks: queue.Queue = queue.Queue()
+        done = object()
+        stop = threading.Event() # set once the primary's audio is no longer wanted
+
+        def produce() -> None:
+            primary = self.primary.stream(text)
+            try:
+                for chunk in primary:
+                    if stop.is_set():
+                        break
+                    chunks.put(chunk)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                primary.close() # stop pulling (and paying for) the upstream stream
+            chunks.put(done)
+
+        threading.Thread(target=produce, daemon=True).start()
+
+        try:
+            try:
+                first = chunks.get(timeout=constants.tts_fallback_timeout)
+            except queue.Empty:
+                first = None
+
+            # primary was too slow or failed before producing audio -> synthesize locally instead
+            if first is None or first is done or isinstance(first, Exception):
+                stop.set()
+                yield from self.fallback.stream(text)
+                return
+
+            item = first
+            while item is not done:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                try:
+                    item = chunks.get(timeout=constants.tts_fallback_timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"Speech backend {self.primary.name} stalled for {constants.tts_fallback_timeout} seconds.")
+        finally:
+            stop.set()
+
+backends: dict[str, type[SpeechBackend]] = {
+    ElevenLabsBackend.name: ElevenLabsBackend,
+    LocalBackend.name: LocalBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+speech_backend: SpeechBackend | None = None
+
+def get_speech_backend() -> SpeechBackend:
+    """Get the configured speech backend, creating it on first use."""
+    global speech_backend
+    if speech_backend is None:
+        if constants.tts_backend not in backends:
+            raise ValueError(f"Unknown speech backend '{constants.tts_backend}'.")
+
+        backend = backends[constants.tts_backend]()
+
+        if constants.tts_fallback_backend:
+            if constants.tts_fallback_backend not in backends:
+                raise ValueError(f"Unknown speech backend '{constants.tts_fallback_backend}'.")
+            backend = FallbackBackend(backend, backends[constants.tts_fallback_backend]())
+
+        speech_backend = backend
+    return speech_backend
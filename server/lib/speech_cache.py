@@ -0,0 +1,142 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+from globals import constants
+from lib import stats
+
+class SpeechCache:
+    """Content-addressed cache of synthesized speech with an in-memory LRU tier and a disk tier (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(SpeechCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.lock = threading.Lock()
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_bytes = 0
+        self.disk: OrderedDict[str, int] = OrderedDict() # key -> blob size, least recently used first
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._load_disk_index()
+        stats.register("speech_cache", self.stats)
+
+    @staticmethod
+    def key(text: str, voice_id: str, model_id: str, output_format: str) -> str:
+        """Content address of a synthesis request."""
+        normalized_text = " ".join(text.split())
+        payload = json.dumps([normalized_text, voice_id, model_id, output_format])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _path(key: str) -> str:
+        return os.path.join(constants.speech_cache_dir, key[:2], f"{key}.mp3")
+
+    def _load_disk_index(self) -> None:
+        """Rebuild the disk tier index from blobs left by previous runs, oldest first."""
+        if not os.path.exists(constants.speech_cache_dir):
+            return
+
+        entries: list[tuple[float, str, int]] = []
+        for directory, _, filenames in os.walk(constants.speech_cache_dir):
+            for filename in filenames:
+                if filename.endswith(".mp3"):
+                    stat = os.stat(os.path.join(directory, filename))
+                    entries.append((stat.st_mtime, filename.removesuffix(".mp3"), stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        """Put a blob into the memory tier, evicting least recently used blobs past the size bound."""
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return
+
+        self.memory[key] = audio
+        self.memory_bytes += len(audio)
+
+        while self.memory_bytes > constants.speech_cache_memory_bytes and self.memory:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def get(self, key: str) -> bytes | None:
+        """Get cached audio, promoting disk hits into memory."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+
+            if key not in self.disk:
+                self.misses += 1
+                return None
+
+        try:
+            with open(SpeechCache._path(key), "rb") as file:
+                audio = file.read()
+            os.utime(SpeechCache._path(key))
+        except OSError:
+            with self.lock:
+                self.disk_bytes -= self.disk.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            self.disk_hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        """Store audio in both tiers, evicting the least recently used blobs from disk past the size bound."""
+        path = SpeechCache._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write atomically so concurrent readers never see a partial blob
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(audio)
+        os.replace(temp_path, path)
+
+        evicted: list[str] = []
+        with self.lock:
+            self._remember(key, audio)
+            self.disk_bytes += len(audio) - self.disk.pop(key, 0)
+            self.disk[key] = len(audio)
+
+            while self.disk_bytes > constants.speech_cache_disk_bytes and len(self.disk) > 1:
+                evicted_key, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                evicted.append(evicted_key)
+
+        for evicted_key in evicted:
+            try:
+                os.remove(SpeechCache._path(evicted_key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk),
+                "disk_bytes": self.disk_bytes,
+            }
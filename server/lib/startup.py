@@ -0,0 +1,75 @@
+from typing import Callable
+import threading
+import time
+from globals import constants
+from lib import stats
+
+class Startup:
+    """Loads the slow parts of the server (vosk model, transcription workers, api clients) as the startup mode says (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(Startup, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.mode = constants.startup_mode
+        self.tasks: dict[str, Callable[[], object]] = {}
+        self.state: dict[str, str] = {} # task -> pending, loading, ready or failed
+        self.seconds: dict[str, float] = {}
+        self.lock = threading.Lock()
+        stats.register("startup", self.stats)
+
+    def register(self, name: str, load: Callable[[], object]) -> None:
+        with self.lock:
+            self.tasks[name] = load
+            self.state[name] = "pending"
+
+    def warm(self) -> None:
+        """Run the pending tasks in order, one failure does not keep the others from loading."""
+        for name, load in list(self.tasks.items()):
+            with self.lock:
+                if self.state[name] != "pending":
+                    continue
+                self.state[name] = "loading"
+
+            started_at = time.perf_counter()
+            try:
+                load()
+                state = "ready"
+            except Exception as e:
+                print(f"Startup task {name} failed: {e}")
+                state = "failed"
+
+            with self.lock:
+                self.state[name] = state
+                self.seconds[name] = time.perf_counter() - started_at
+
+    def start(self) -> None:
+        if self.mode == "eager":
+            self.warm()
+            failed = [name for name, state in self.state.items() if state == "failed"]
+            if failed:
+                raise RuntimeError(f"Startup failed: {', '.join(failed)}.")
+        elif self.mode == "background":
+            threading.Thread(target=self.warm, name="startup", daemon=True).start()
+        elif self.mode != "lazy":
+            raise ValueError(f"Unknown startup mode '{self.mode}'.")
+
+    def ready(self) -> bool:
+        """Whether requests can be routed here; in lazy mode the first requests load what they need."""
+        with self.lock:
+            return self.mode == "lazy" or all(state == "ready" for state in self.state.values())
+
+    def stats(self) -> dict:
+        ready = self.ready()
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "ready": ready,
+                "tasks": {name: {"state": state, "seconds": self.seconds.get(name)} for name, state in self.state.items()},
+            }
@@ -0,0 +1,84 @@
+from typing import Any, Callable
+import bisect
+import re
+import threading
+
+type StatsProvider = Callable[[], dict[str, Any]]
+
+providers: dict[str, StatsProvider] = {}
+
+def register(name: str, provider: StatsProvider) -> None:
+    """Register a callable that returns a snapshot of a component's runtime stats."""
+    providers[name] = provider
+
+def collect() -> dict[str, dict[str, Any]]:
+    """Collect a snapshot from every registered stats provider."""
+    return {name: provider() for name, provider in list(providers.items())} # providers may register while collecting
+
+def _metric_name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(("hem", *parts)))
+
+def _is_histogram(value: Any) -> bool:
+    return isinstance(value, dict) and value.keys() == {"count", "sum", "buckets"}
+
+def prometheus() -> str:
+    """Render every provider's snapshot in the Prometheus text format: histogram snapshots as histograms
+    (keyed ones get a "name" label, e.g. per host or per stage) and every other number as a gauge."""
+    lines: list[str] = []
+
+    def histogram(metric: str, snapshot: dict, labels: str) -> None:
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {count}')
+        lines.append(f"{metric}_sum{{{labels.rstrip(',')}}} {snapshot['sum']}")
+        lines.append(f"{metric}_count{{{labels.rstrip(',')}}} {snapshot['count']}")
+
+    def flatten(path: tuple[str, ...], value: Any) -> None:
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            metric = _metric_name(*path)
+            lines.extend((f"# TYPE {metric} gauge", f"{metric} {value}"))
+        elif _is_histogram(value):
+            metric = _metric_name(*path)
+            lines.append(f"# TYPE {metric} histogram")
+            histogram(metric, value, "")
+        elif isinstance(value, dict) and value and all(_is_histogram(item) for item in value.values()):
+            metric = _metric_name(*path)
+            lines.append(f"# TYPE {metric} histogram")
+            for name, snapshot in value.items():
+                histogram(metric, snapshot, f'name="{name}",')
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                flatten((*path, str(key)), item)
+        # strings, lists and missing values are left out
+
+    for name, snapshot in collect().items():
+        flatten((name,), snapshot)
+
+    return "\n".join(lines) + "\n"
+
+class Histogram:
+    """Thread-safe histogram with fixed bucket upper bounds (cumulative counts are computed on snapshot)."""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last slot counts observations above the largest bound
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self.count
+            return {"count": self.count, "sum": self.sum, "buckets": buckets}
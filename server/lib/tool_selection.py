@@ -0,0 +1,108 @@
+from typing import Iterable
+from anthropic.types import MessageParam, ToolParam
+import json
+import re
+import threading
+from globals import constants
+from db.utils import Macro
+from lib.actions import Actions
+from lib import stats
+
+def action_identifier(action_name: str) -> str:
+    """Registry name of a seeded action name (e.g. "Get Weather" -> "get_weather")."""
+    return "_".join(action_name.lower().split())
+
+def _normalize_text(text: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split())
+
+def _history_tool_names(messages: Iterable[MessageParam]) -> set[str]:
+    """Tools called earlier in the conversation, which must stay defined for their tool_use blocks."""
+    return {
+        block["name"]
+        for message in messages if message["role"] == "assistant" and not isinstance(message["content"], str)
+        for block in message["content"] if isinstance(block, dict) and block.get("type") == "tool_use"
+    }
+
+class ToolSelector:
+    """Picks the tool schemas sent with a request: only a restricted macro's tools when one is invoked, otherwise all
+    tools (or, with the relevance filter on, the ones whose keywords appear in the message) (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(ToolSelector, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.actions = Actions()
+        self.schema_tokens = {
+            schema["name"]: len(json.dumps(schema)) // 4 # same ~4 characters per token estimate as the conversation budget
+            for schema in self.actions.action_schemas
+        }
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.subsetted = 0
+        self.tokens_sent = 0
+        self.tokens_available = 0
+        stats.register("tool_selection", self.stats)
+
+    @staticmethod
+    def invoked_macro(macros: list[Macro] | None, user_prompt: str) -> Macro | None:
+        """The macro the message triggers ("run <name>" or "macro <name>"), if exactly one matches."""
+        text = _normalize_text(user_prompt)
+        invoked = [
+            macro for macro in macros or []
+            if _normalize_text(macro.name)
+            and re.search(rf"\b(?:run|macro)\s+(?:the\s+|my\s+)?{re.escape(_normalize_text(macro.name))}\b", text)
+        ]
+        return invoked[0] if len(invoked) == 1 else None
+
+    def _relevant(self, user_prompt: str) -> set[str] | None:
+        """Tools whose keywords appear in the message, plus tools without keywords; None when nothing matched."""
+        words = set(_normalize_text(user_prompt).split())
+        matched, unkeyed = set(), set()
+        for name, action in self.actions.action_registry.items():
+            keywords = getattr(action, "__keywords__", None)
+            if keywords is None:
+                unkeyed.add(name)
+            elif words.intersection(keywords):
+                matched.add(name)
+        return matched | unkeyed if matched else None
+
+    def select(self, macros: list[Macro] | None, user_prompt: str, history: Iterable[MessageParam] = ()) -> list[ToolParam]:
+        """Compute the minimal tool set for a message, keeping the registry's order."""
+        names: set[str] | None = None
+        macro = ToolSelector.invoked_macro(macros, user_prompt)
+
+        if macro and not macro.allow_other_actions:
+            names = {action_identifier(name) for name in macro.required_actions}
+        elif constants.tool_relevance_filter:
+            names = self._relevant(user_prompt)
+            if names is not None and macro:
+                names |= {action_identifier(name) for name in macro.required_actions}
+
+        schemas = self.actions.action_schemas
+        if names is not None:
+            names |= _history_tool_names(history)
+            schemas = [schema for schema in schemas if schema["name"] in names]
+
+        with self.lock:
+            self.requests += 1
+            self.subsetted += len(schemas) < len(self.actions.action_schemas)
+            self.tokens_sent += sum(self.schema_tokens[schema["name"]] for schema in schemas)
+            self.tokens_available += sum(self.schema_tokens.values())
+
+        return schemas
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "subsetted": self.subsetted,
+                "schema_tokens_sent": self.tokens_sent,
+                "schema_tokens_saved": self.tokens_available - self.tokens_sent,
+                "avg_schema_tokens": self.tokens_sent / self.requests if self.requests else 0.0,
+            }
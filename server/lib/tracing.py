@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, TypeVar
+import threading
+import time
+from globals import constants
+from lib import stats
+from lib.stats import Histogram
+
+T = TypeVar("T")
+
+type Trace = list[tuple[str, float]] # (stage, seconds) in the order the stages finished
+
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+stage_latency: dict[str, Histogram] = {} # stage -> seconds
+values: dict[str, Histogram] = {} # e.g. tokens or tool rounds per message
+lock = threading.Lock()
+
+def start_trace() -> Trace:
+    """Collect the stages of the current request (work submitted with a copied context reports to it as well)."""
+    trace: Trace = []
+    current_trace.set(trace)
+    return trace
+
+def record(stage: str, seconds: float) -> None:
+    with lock:
+        if stage not in stage_latency:
+            stage_latency[stage] = Histogram(constants.stage_latency_buckets)
+        histogram = stage_latency[stage]
+    histogram.observe(seconds)
+
+    trace = current_trace.get()
+    if trace is not None:
+        trace.append((stage, seconds))
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as a stage of the current request."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started_at)
+
+def traced_stream(stage: str, chunks: Iterator[T]) -> Iterator[T]:
+    """Time a lazily produced stream: until its first chunk (<stage>_first_chunk) and until it is exhausted."""
+    started_at = time.perf_counter()
+    first = True
+    for chunk in chunks:
+        if first:
+            first = False
+            record(f"{stage}_first_chunk", time.perf_counter() - started_at)
+        yield chunk
+    record(stage, time.perf_counter() - started_at)
+
+def observe(name: str, value: float, buckets: tuple[float, ...]) -> None:
+    """Record a non-latency value, e.g. the tokens used by one message."""
+    with lock:
+        if name not in values:
+            values[name] = Histogram(buckets)
+            stats.register(name, values[name].snapshot) # its own metric, units differ between values
+        histogram = values[name]
+    histogram.observe(value)
+
+def server_timing(trace: Trace) -> str:
+    """Format a trace as a Server-Timing header, summing repeated stages (e.g. several llm rounds)."""
+    totals: dict[str, list[float]] = {}
+    for stage, seconds in trace:
+        total = totals.setdefault(stage, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+    return ", ".join(
+        f'{stage};dur={seconds * 1000:.1f}' + (f';desc="{count}x"' if count > 1 else "")
+        for stage, (seconds, count) in totals.items()
+    )
+
+def _snapshot(histograms: dict[str, Histogram]) -> dict:
+    with lock:
+        histograms = dict(histograms)
+    return {name: histogram.snapshot() for name, histogram in histograms.items()}
+
+stats.register("stage_seconds", lambda: _snapshot(stage_latency))
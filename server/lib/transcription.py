@@ -0,0 +1,124 @@
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+import multiprocessing
+import threading
+import time
+from globals import constants
+from lib.load import load_vosk_model
+from lib import stats
+
+class TranscriptionQueueFull(RuntimeError):
+    """Raised when the transcription queue stays full for longer than the queue timeout."""
+
+def _init_worker() -> None:
+    """Load the vosk model once when a worker process starts."""
+    from lib import conversions
+    conversions.get_model()
+
+def _started() -> None:
+    """No-op job, done once a worker process has started and loaded the model."""
+
+def _transcribe(pcm: bytes, sample_rate: int) -> tuple[str, float]:
+    """Transcribe PCM frames inside a worker process, returning the text and the decode time."""
+    from lib import conversions
+    started_at = time.perf_counter()
+    text = conversions.audio_to_text(pcm, sample_rate)
+    return text, time.perf_counter() - started_at
+
+class TranscriptionPool:
+    """Bounded pool of worker processes that each hold the vosk model (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(TranscriptionPool, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.workers = constants.transcription_workers
+        self.capacity = self.workers + constants.transcription_queue_size
+        self.executor: ProcessPoolExecutor | None = None
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.decode_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.last_real_time_factor = 0.0
+        stats.register("transcription", self.stats)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use."""
+        with self.lock:
+            if self.executor is None:
+                # download the model once here, instead of in every worker at the same time
+                load_vosk_model()
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self.executor
+
+    def _record(self, audio_seconds: float, future: Future) -> None:
+        """Release the queue slot and record decode metrics once a job finishes."""
+        self.slots.release()
+        with self.lock:
+            self.in_flight -= 1
+            if future.cancelled() or future.exception():
+                return
+            _, decode_seconds = future.result()
+            self.completed += 1
+            self.decode_seconds += decode_seconds
+            self.audio_seconds += audio_seconds
+            self.last_real_time_factor = decode_seconds / audio_seconds if audio_seconds else 0.0
+
+    def submit(self, pcm: bytes, sample_rate: int) -> Future:
+        """Queue PCM frames for transcription, blocking while the queue is full.
+        The future resolves to a (text, decode seconds) tuple."""
+        if not self.slots.acquire(timeout=constants.transcription_queue_timeout):
+            with self.lock:
+                self.rejected += 1
+            raise TranscriptionQueueFull("Transcription queue is full.")
+
+        with self.lock:
+            self.in_flight += 1
+
+        audio_seconds = len(pcm) / 2 / sample_rate
+        try:
+            future = self._get_executor().submit(_transcribe, pcm, sample_rate)
+        except Exception:
+            self.slots.release()
+            with self.lock:
+                self.in_flight -= 1
+            raise
+
+        future.add_done_callback(lambda f: self._record(audio_seconds, f))
+        return future
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        """Transcribe PCM frames on the worker pool and wait for the text."""
+        text, _ = self.submit(pcm, sample_rate).result()
+        return text
+
+    def warm(self) -> None:
+        """Start the worker processes and wait until they loaded the model, instead of on the first request."""
+        executor = self._get_executor()
+        for future in wait([executor.submit(_started) for _ in range(self.workers)]).done:
+            future.result()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "real_time_factor": self.decode_seconds / self.audio_seconds if self.audio_seconds else 0.0,
+                "last_real_time_factor": self.last_real_time_factor,
+            }
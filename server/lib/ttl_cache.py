@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable
+import asyncio
+import threading
+import time
+
+class TTLCache:
+    """LRU-bounded cache with per-entry expiry and single-flight computation of missing entries."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict() # key -> (expires at, value)
+        self.in_flight: dict[Hashable, Future] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _claim(self, key: Hashable) -> tuple[str, Any]:
+        """Look up a key: ("hit", value), ("wait", future of the caller computing it) or ("lead", future to resolve)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return "hit", entry[1]
+
+            if key in self.in_flight:
+                self.coalesced += 1
+                return "wait", self.in_flight[key]
+
+            self.misses += 1
+            future = Future()
+            self.in_flight[key] = future
+            return "lead", future
+
+    def _settle(self, key: Hashable, future: Future, ttl: float, value: Any = None, error: BaseException | None = None) -> None:
+        """Store a computed value (errors are not cached) and wake up callers waiting on it."""
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if error is None:
+                self.entries[key] = (time.monotonic() + ttl, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def get_or_compute(self, key: Hashable, ttl: float, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing it once for all concurrent callers when missing or expired."""
+        state, result = self._claim(key)
+        if state == "hit":
+            return result
+        if state == "wait":
+            return result.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self._settle(key, result, ttl, error=e)
+            raise
+        self._settle(key, result, ttl, value=value)
+        return value
+
+    async def aget_or_compute(self, key: Hashable, ttl: float, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Asyncio variant of get_or_compute, sharing entries and in-flight computations with threaded callers."""
+        state, result = self._claim(key)
+        if state == "hit":
+            return result
+        if state == "wait":
+            return await asyncio.wrap_future(result)
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._settle(key, result, ttl, error=e)
+            raise
+        self._settle(key, result, ttl, value=value)
+        return value
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
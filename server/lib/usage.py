@@ -0,0 +1,63 @@
+from collections import deque
+from typing import Any
+import dataclasses
+import threading
+from globals import constants
+from lib import stats, tracing
+
+@dataclasses.dataclass
+class RequestUsage:
+    """Token usage of one handled message, summed over all of its llm rounds."""
+    rounds: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+    def add(self, usage: Any) -> None:
+        """Add the usage reported on an anthropic response."""
+        self.rounds += 1
+        self.input_tokens += usage.input_tokens or 0
+        self.output_tokens += usage.output_tokens or 0
+        self.cache_creation_input_tokens += getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.cache_read_input_tokens += getattr(usage, "cache_read_input_tokens", None) or 0
+
+class UsageTracker:
+    """Keeps totals and the most recent per-request llm usage records (singleton)."""
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(UsageTracker, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self) -> None:
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+        self._initialized = True
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.totals = RequestUsage()
+        self.recent: deque[dict] = deque(maxlen=100)
+        stats.register("llm_usage", self.stats)
+
+    def record(self, user_id: Any, usage: RequestUsage) -> None:
+        with self.lock:
+            self.requests += 1
+            for field in dataclasses.fields(RequestUsage):
+                setattr(self.totals, field.name, getattr(self.totals, field.name) + getattr(usage, field.name))
+            self.recent.append({"user": str(getattr(user_id, "id", user_id)), **dataclasses.asdict(usage)})
+
+        tracing.observe("llm_input_tokens", usage.input_tokens + usage.cache_creation_input_tokens + usage.cache_read_input_tokens, constants.token_buckets)
+        tracing.observe("llm_output_tokens", usage.output_tokens, constants.token_buckets)
+        tracing.observe("tool_rounds", max(usage.rounds - 1, 0), constants.tool_round_buckets)
+
+    def stats(self) -> dict:
+        with self.lock:
+            cacheable_tokens = self.totals.input_tokens + self.totals.cache_creation_input_tokens + self.totals.cache_read_input_tokens
+            return {
+                "requests": self.requests,
+                **dataclasses.asdict(self.totals),
+                "cache_read_ratio": self.totals.cache_read_input_tokens / cacheable_tokens if cacheable_tokens else 0.0,
+                "recent": list(self.recent),
+            }
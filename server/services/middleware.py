@@ -7,6 +7,10 @@ def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         key = request.headers.get('X-Admin-Key')
+        # bearer tokens for clients that cannot send custom headers (e.g. metrics scrapers)
+        authorization = request.headers.get('Authorization', '')
+        if key is None and authorization.startswith('Bearer '):
+            key = authorization.removeprefix('Bearer ')
         if key != os.getenv('ADMIN_API_KEY'):
             abort(403, 'Admin key required')
         return f(*args, **kwargs)
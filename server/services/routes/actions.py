@@ -1,19 +1,29 @@
 from flask import Blueprint, jsonify, abort, request
 from db.models import Action
 from services.middleware import admin_required
+from services.utils import cached_json_response, response_cache
+from lib.prompts import Prompts
 
 actions_bp = Blueprint('actions', __name__)
 
+def invalidate_actions() -> None:
+    # macro listings and compiled system prompts embed action names
+    response_cache.invalidate('actions')
+    response_cache.invalidate_prefix('macros:')
+    Prompts.invalidate_all()
+
 @actions_bp.route('/actions', methods=['GET'])
 def list_actions():
-    actions = [{'id': a.id, 'name': a.name, 'description': a.description} for a in Action.select()]
-    return jsonify(actions)
+    return cached_json_response('actions', lambda: [
+        {'id': a.id, 'name': a.name, 'description': a.description} for a in Action.select()
+    ])
 
 @actions_bp.route('/actions', methods=['POST'])
 @admin_required
 def create_action():
     data = request.get_json() or {}
     a = Action.create(name=data.get('name'), description=data.get('description', ''))
+    invalidate_actions()
     return jsonify({'id': a.id, 'name': a.name}), 201
 
 @actions_bp.route('/actions/<int:action_id>', methods=['PUT'])
@@ -26,6 +36,7 @@ def edit_action(action_id):
     a.name = data.get('name', a.name)
     a.description = data.get('description', a.description)
     a.save()
+    invalidate_actions()
     return jsonify({'id': a.id, 'name': a.name})
 
 @actions_bp.route('/actions/<int:action_id>', methods=['DELETE'])
@@ -37,4 +48,5 @@ def delete_action(action_id):
         abort(404)
 
     a.delete_instance()
+    invalidate_actions()
     return '', 204
\ No newline at end of file
@@ -0,0 +1,17 @@
+from flask import Blueprint, jsonify
+from lib.startup import Startup
+
+health_bp = Blueprint('health', __name__)
+
+startup = Startup() # initialize the Startup class (singleton)
+
+@health_bp.route('/healthz', methods=['GET'])
+def liveness():
+    """The process is up and serving, even while the models are still loading."""
+    return jsonify({'status': 'ok'})
+
+@health_bp.route('/readyz', methods=['GET'])
+def readiness():
+    """Whether the instance should receive traffic: 503 until the startup tasks are done."""
+    status = startup.stats()
+    return jsonify(status), 200 if status['ready'] else 503
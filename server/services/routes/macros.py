@@ -1,29 +1,93 @@
 from flask import Blueprint, jsonify, abort, request
-from db.models import Macro, MacroAction, Action
-from services.utils import get_user_from_header
+from peewee import chunked
+from uuid import UUID, uuid4
+from db.models import db, Macro, MacroAction, Action
+from services.utils import get_user_from_header, response_cache, user_macros_cache_key
+from lib.prompts import Prompts
+from globals import constants
 
 macros_bp = Blueprint('macros', __name__)
 
+def parse_action_ids(action_ids) -> list[UUID]:
+    """Parse requested action ids, dropping duplicates and malformed ids."""
+    parsed = {}
+    for aid in action_ids or []:
+        try:
+            parsed[UUID(str(aid))] = None
+        except ValueError:
+            continue
+    return list(parsed)
+
+def existing_action_ids(action_ids: list[UUID]) -> set[UUID]:
+    """Find which of the action ids exist with a single IN query."""
+    if not action_ids:
+        return set()
+    return {aid for (aid,) in Action.select(Action.id).where(Action.id.in_(action_ids)).tuples()}
+
+def insert_rows(model, rows: list[dict]) -> None:
+    for batch in chunked(rows, constants.macro_insert_batch_size):
+        model.insert_many(batch).execute()
+
+def macro_action_rows(macro_id, action_ids: list[UUID], existing: set[UUID]) -> list[dict]:
+    # unknown actions are skipped, as before
+    return [{'macro': macro_id, 'action': aid} for aid in action_ids if aid in existing]
+
 @macros_bp.route('/macros', methods=['POST'])
 def create_macro():
     user = get_user_from_header()
     data = request.get_json() or {}
-    m = Macro.create(
-        user=user,
-        name=data.get('name'),
-        prompt=data.get('prompt'),
-        allow_other_actions=data.get('allow_other_actions', False)
-    )
-    req_ids = data.get('required_actions', [])
-    for aid in req_ids:
-        act = Action.get_or_none(Action.id == aid)
-
-        if not act:
-            continue
+    action_ids = parse_action_ids(data.get('required_actions', []))
+    existing = existing_action_ids(action_ids)
+
+    with db.atomic():
+        m = Macro.create(
+            user=user,
+            name=data.get('name'),
+            prompt=data.get('prompt'),
+            allow_other_actions=data.get('allow_other_actions', False)
+        )
+        insert_rows(MacroAction, macro_action_rows(m.id, action_ids, existing))
 
-        MacroAction.create(macro=m, action=act)
+    Prompts.invalidate_user(user)
+    response_cache.invalidate(user_macros_cache_key(user))
     return jsonify({'id': m.id, 'name': m.name}), 201
 
+@macros_bp.route('/macros/import', methods=['POST'])
+def import_macros():
+    """Create many macros for the user in one transaction, resolving all their actions with one query."""
+    user = get_user_from_header()
+    data = request.get_json() or {}
+    macros = data.get('macros')
+
+    if not isinstance(macros, list) or not all(isinstance(macro, dict) for macro in macros):
+        abort(400, 'Expected a list of macros')
+
+    if len(macros) > constants.macro_import_max_macros:
+        abort(413, f'At most {constants.macro_import_max_macros} macros can be imported at once')
+
+    requested = [parse_action_ids(macro.get('required_actions', [])) for macro in macros]
+    existing = existing_action_ids(list({aid for action_ids in requested for aid in action_ids}))
+
+    macro_rows, action_rows = [], []
+    for macro, action_ids in zip(macros, requested):
+        macro_id = uuid4()
+        macro_rows.append({
+            'id': macro_id,
+            'user': user.id,
+            'name': macro.get('name'),
+            'prompt': macro.get('prompt'),
+            'allow_other_actions': macro.get('allow_other_actions', False),
+        })
+        action_rows += macro_action_rows(macro_id, action_ids, existing)
+
+    with db.atomic():
+        insert_rows(Macro, macro_rows)
+        insert_rows(MacroAction, action_rows)
+
+    Prompts.invalidate_user(user)
+    response_cache.invalidate(user_macros_cache_key(user))
+    return jsonify([{'id': row['id'], 'name': row['name']} for row in macro_rows]), 201
+
 @macros_bp.route('/macros/<string:macro_id>', methods=['PUT'])
 def edit_macro(macro_id):
     user = get_user_from_header()
@@ -36,19 +100,20 @@ def edit_macro(macro_id):
         abort(403)
 
     data = request.get_json() or {}
-    m.name = data.get('name', m.name)
-    m.prompt = data.get('prompt', m.prompt)
-    m.allow_other_actions = data.get('allow_other_actions', m.allow_other_actions)
-    m.save()
-    if 'required_actions' in data:
-        MacroAction.delete().where(MacroAction.macro == m).execute()
-        for aid in data['required_actions']:
-            act = Action.get_or_none(Action.id == aid)
-
-            if not act:
-                continue
-
-            MacroAction.create(macro=m, action=act)
+    action_ids = parse_action_ids(data.get('required_actions', []))
+    existing = existing_action_ids(action_ids)
+
+    with db.atomic():
+        m.name = data.get('name', m.name)
+        m.prompt = data.get('prompt', m.prompt)
+        m.allow_other_actions = data.get('allow_other_actions', m.allow_other_actions)
+        m.save()
+        if 'required_actions' in data:
+            MacroAction.delete().where(MacroAction.macro == m).execute()
+            insert_rows(MacroAction, macro_action_rows(m.id, action_ids, existing))
+
+    Prompts.invalidate_user(user)
+    response_cache.invalidate(user_macros_cache_key(user))
     return jsonify({'id': m.id, 'name': m.name})
 
 @macros_bp.route('/macros/<string:macro_id>', methods=['DELETE'])
@@ -62,4 +127,6 @@ def delete_macro(macro_id):
     if m.user != user:
         abort(403)
     m.delete_instance(recursive=True)
+    Prompts.invalidate_user(user)
+    response_cache.invalidate(user_macros_cache_key(user))
     return '', 204
\ No newline at end of file
@@ -1,21 +1,110 @@
-import os
-import io
-from flask import Blueprint, request, jsonify, send_file
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context, abort
 from services.utils import get_user_from_header
-from lib import processor, conversions
-import pydub
-import tempfile
+from db.models import with_connection
+from lib import processor, conversions, tracing
+from lib.conversations import Turn
+from lib.recognition import RecognitionSessions
+from lib.transcription import TranscriptionPool, TranscriptionQueueFull
+from lib.jobs import JobQueue, JobQueueFull
+from globals import constants
 
 pipeline_bp = Blueprint('pipeline', __name__)
 
 processor_singleton = processor.Processor() # initialize the Processor class (singleton)
+recognition_sessions = RecognitionSessions() # initialize the RecognitionSessions class (singleton)
+transcription_pool = TranscriptionPool() # initialize the TranscriptionPool class (singleton)
+job_queue = JobQueue() # initialize the JobQueue class (singleton)
+
+def transcribe_upload() -> tuple[str | None, tuple[Response, int] | None]:
+    """Transcribe the uploaded audio file, returning the transcription or an error response."""
+
+    if 'file' not in request.files:
+        return None, (jsonify({'error': 'No file part'}), 400)
+
+    file = request.files['file']
+
+    if file.filename == '':
+        return None, (jsonify({'error': 'No selected file'}), 400)
+
+    # decode the upload in memory to mono 16-bit PCM
+    try:
+        with tracing.span("decode"):
+            pcm, sample_rate = conversions.normalize_audio(file.read())
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+
+    # transcribe on the worker pool, shedding load when the queue is full
+    try:
+        with tracing.span("transcribe"):
+            return transcription_pool.transcribe(pcm, sample_rate), None
+    except TranscriptionQueueFull as e:
+        error = jsonify({'error': str(e)})
+        error.headers['Retry-After'] = str(constants.transcription_queue_timeout)
+        return None, (error, 503)
 
 @pipeline_bp.route('/respond', methods=['POST'])
 def response_pipeline():
     user_id = get_user_from_header()
 
+    if request.args.get('mode', constants.respond_mode) == 'job':
+        return enqueue_upload(user_id)
+
     # ----------------------------- transcribe audio ----------------------------- #
 
+    transcription, error = transcribe_upload()
+    if error:
+        return error
+
+    # ------------------------- process message with llm ------------------------- #
+
+    response, actions_performed = processor_singleton.handle_message(user_id, transcription)
+
+    # -------------------- convert back to audio and send back ------------------- #
+
+    return Response(stream_with_context(conversions.text_to_audio(response)), mimetype=conversions.audio_mimetype())
+
+@pipeline_bp.route('/respond/stream', methods=['POST'])
+def streaming_response_pipeline():
+    """Same as /respond, but streams audio back sentence by sentence while the llm is still generating."""
+    started_at = time.perf_counter()
+    user_id = get_user_from_header()
+
+    # ----------------------------- transcribe audio ----------------------------- #
+
+    transcription, error = transcribe_upload()
+    if error:
+        return error
+
+    # -------------- stream llm text -> sentence chunks -> audio chunks ---------- #
+
+    def generate_audio():
+        first_audio_sent = False
+        text_stream = processor_singleton.stream_message(user_id, transcription)
+
+        for sentence in conversions.chunk_sentences(text_stream):
+            for chunk in conversions.text_to_audio(sentence):
+                if not first_audio_sent:
+                    first_audio_sent = True
+                    tracing.record("first_audio", time.perf_counter() - started_at)
+                yield chunk
+
+    return Response(stream_with_context(generate_audio()), mimetype=conversions.audio_mimetype())
+
+# --------------------------------- job mode --------------------------------- #
+
+def job_json(job: dict) -> dict:
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'transcription': job['transcription'],
+        'response': job['response'],
+        'error': job['error'],
+        'audio_url': f"/respond/jobs/{job['id']}/audio" if job['status'] == 'done' else None,
+    }
+
+def enqueue_upload(user):
+    """Queue the uploaded audio for the job workers and return where to poll for the result."""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
 
@@ -24,37 +113,111 @@ def response_pipeline():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    # save the file to a temporary location
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        file.save(tmp.name)
-        tmp.flush()
-        temp_file_path = tmp.name
+    try:
+        job_id = job_queue.enqueue(user, file.read())
+    except JobQueueFull as e:
+        error = jsonify({'error': str(e)})
+        error.headers['Retry-After'] = str(constants.job_long_poll_max)
+        return error, 503
 
-    # convert the audio to WAV format, mono channel, PCM encoding
-    audio = pydub.AudioSegment.from_file(temp_file_path)
-    audio = audio.set_channels(1)  # convert to mono
-    audio = audio.set_frame_rate(16000)  # set sample rate to 16 kHz
-    audio = audio.set_sample_width(2)  # set sample width to 16-bit (PCM)
-    wav_path = temp_file_path + ".wav"
-    audio.export(wav_path, format="wav", codec="pcm_s16le")  # export as PCM WAV
+    accepted = jsonify({'id': job_id, 'status': 'queued', 'status_url': f'/respond/jobs/{job_id}'})
+    accepted.headers['Location'] = f'/respond/jobs/{job_id}'
+    return accepted, 202
 
-    try:
-        transcription = conversions.audio_to_text(wav_path)
-    finally:
-        os.remove(temp_file_path)
-        os.remove(wav_path)
+def get_owned_job(job_id: str, user) -> dict:
+    job = job_queue.get(job_id)
 
-    # ------------------------- process message with llm ------------------------- #
+    if not job:
+        abort(404)
 
-    response, actions_performed = processor_singleton.handle_message(user_id, transcription)
+    if job['user_id'] != str(user.id):
+        abort(403)
 
-    # -------------------- convert back to audio and send back ------------------- #
+    return job
+
+@pipeline_bp.route('/respond/jobs', methods=['POST'])
+def create_response_job():
+    """Same as /respond?mode=job: queue the recording and respond later through a job worker (see worker.py)."""
+    return enqueue_upload(get_user_from_header())
+
+@pipeline_bp.route('/respond/jobs/<string:job_id>', methods=['GET'])
+def get_response_job(job_id):
+    """Job status; with ?wait=<seconds> the request is held until the job finishes (long-polling)."""
+    user = get_user_from_header()
+    job = get_owned_job(job_id, user)
+
+    wait = min(request.args.get('wait', 0, type=float), constants.job_long_poll_max)
+    if wait > 0 and job['status'] in ('queued', 'running'):
+        job = job_queue.wait(job_id, wait) or job
+
+    return jsonify(job_json(job))
+
+@pipeline_bp.route('/respond/jobs/<string:job_id>/audio', methods=['GET'])
+def get_response_job_audio(job_id):
+    user = get_user_from_header()
+    job = get_owned_job(job_id, user)
+
+    result = job_queue.result(job_id)
+    if not result:
+        return jsonify(job_json(job)), 409
+
+    audio, mimetype = result
+    return Response(audio, mimetype=mimetype)
+
+# ----------------------- incremental recognition sessions ------------------- #
+
+def get_owned_session(session_id: str, user, pop: bool = False):
+    """Get a recognition session by id, making sure it belongs to the requesting user."""
+    session = recognition_sessions.get(session_id)
+
+    if not session:
+        abort(404)
+
+    if session.user != user:
+        abort(403)
+
+    return recognition_sessions.pop(session_id) if pop else session
+
+@pipeline_bp.route('/respond/sessions', methods=['POST'])
+def create_recognition_session():
+    """Open a session that accepts 16-bit mono PCM frames while the user is still speaking."""
+    user = get_user_from_header()
+    sample_rate = request.args.get('sample_rate', constants.recognition_sample_rate, type=int)
+
+    # speculative responses may be discarded, so turns are only added to the conversation once used
+    def respond(transcription: str) -> Turn:
+        return processor_singleton.complete(user, transcription)
+
+    @with_connection # runs on the speculation executor, outside of the request
+    def speculate(transcription: str) -> Turn | None:
+        return processor_singleton.complete(user, transcription, speculative=True)
+
+    session = recognition_sessions.create(user, sample_rate, respond, speculate)
+    return jsonify({'session_id': session.id, 'sample_rate': session.sample_rate}), 201
+
+@pipeline_bp.route('/respond/sessions/<string:session_id>/audio', methods=['POST'])
+def stream_session_audio(session_id):
+    """Feed raw PCM frames (the body may be chunked) and return the latest partial/final hypotheses."""
+    user = get_user_from_header()
+    session = get_owned_session(session_id, user)
+
+    finals: list[str] = []
+    update = {'partial': '', 'transcript': session.transcript}
+
+    while chunk := request.stream.read(constants.recognition_chunk_bytes):
+        update = session.accept(chunk)
+        if update.get('final'):
+            finals.append(update['final'])
+
+    return jsonify({**update, 'finals': finals})
+
+@pipeline_bp.route('/respond/sessions/<string:session_id>/end', methods=['POST'])
+def end_recognition_session(session_id):
+    """Close the session and respond to the full transcript with audio."""
+    user = get_user_from_header()
+    session = get_owned_session(session_id, user, pop=True)
 
-    buffer = conversions.text_to_audio(response)
+    transcription, turn = session.finish()
+    processor.conversations.append(user, turn)
 
-    return send_file(
-        io.BytesIO(buffer.getvalue()),  # make sure it's a real BytesIO
-        mimetype="audio/wav",
-        as_attachment=False,
-        download_name="response.wav"
-    )
\ No newline at end of file
+    return Response(stream_with_context(conversions.text_to_audio(turn.text)), mimetype=conversions.audio_mimetype())
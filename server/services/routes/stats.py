@@ -0,0 +1,17 @@
+from flask import Blueprint, Response, jsonify
+from services.middleware import admin_required
+from lib import stats
+
+stats_bp = Blueprint('stats', __name__)
+
+@stats_bp.route('/stats', methods=['GET'])
+@admin_required
+def get_stats():
+    """Runtime stats of the server's pools, queues and caches."""
+    return jsonify(stats.collect())
+
+@stats_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """The same stats in the Prometheus text format, including per-stage latency histograms."""
+    return Response(stats.prometheus(), mimetype='text/plain; version=0.0.4')
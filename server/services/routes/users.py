@@ -1,6 +1,10 @@
-from flask import Blueprint, jsonify, abort
+from flask import Blueprint, jsonify, abort, request
 import uuid
-from db.models import User
+from db.models import User, UserSettings
+from db import utils
+from lib.prompts import Prompts
+from lib.conversations import ConversationStore
+from services.utils import cached_json_response, response_cache, user_macros_cache_key
 
 users_bp = Blueprint('users', __name__)
 
@@ -25,22 +29,55 @@ def delete_user(user_id):
     except Exception:
         abort(404)
     u.delete_instance(recursive=True)
+    Prompts.invalidate_user(u)
+    ConversationStore().clear(u)
+    response_cache.invalidate(user_macros_cache_key(u))
     return '', 204
 
 @users_bp.route('/users/<user_id>/macros', methods=['GET'])
 def get_user_macros(user_id):
     try:
-        u = User.get(User.id == uuid.UUID(user_id))
-    except Exception:
+        user_id = uuid.UUID(user_id)
+    except ValueError:
         abort(404)
-    macros = []
-    for m in u.macros:
-        actions = [{'id': ma.action.id, 'name': ma.action.name} for ma in m.required_actions]
-        macros.append({
+
+    def build():
+        macros = utils.get_user_macros(user_id)
+
+        if macros is None:
+            abort(404)
+
+        return [{
             'id': m.id,
             'name': m.name,
             'prompt': m.prompt,
             'allow_other_actions': m.allow_other_actions,
-            'required_actions': actions
-        })
-    return jsonify(macros)
\ No newline at end of file
+            'required_actions': [{'id': aid, 'name': name} for aid, name in zip(m.required_action_ids, m.required_actions)]
+        } for m in macros]
+
+    return cached_json_response(user_macros_cache_key(user_id), build)
+
+def get_user_or_404(user_id) -> User:
+    try:
+        return User.get(User.id == uuid.UUID(user_id))
+    except Exception:
+        abort(404)
+
+@users_bp.route('/users/<user_id>/settings', methods=['GET'])
+def get_user_settings(user_id):
+    u = get_user_or_404(user_id)
+    settings = UserSettings.get_or_none(UserSettings.user == u) or UserSettings(user=u)
+    return jsonify({'fast_path': settings.fast_path})
+
+@users_bp.route('/users/<user_id>/settings', methods=['PATCH'])
+def edit_user_settings(user_id):
+    u = get_user_or_404(user_id)
+    data = request.get_json() or {}
+
+    if 'fast_path' in data and not isinstance(data['fast_path'], bool):
+        abort(400, 'fast_path must be a boolean')
+
+    settings, _ = UserSettings.get_or_create(user=u)
+    settings.fast_path = data.get('fast_path', settings.fast_path)
+    settings.save()
+    return jsonify({'fast_path': settings.fast_path})
@@ -1,6 +1,10 @@
-from flask import request, abort
+from flask import request, abort, current_app, Response
+from typing import Any, Callable
 import uuid
 from db.models import User
+from lib.response_cache import ResponseCache
+
+response_cache = ResponseCache() # initialize the ResponseCache class (singleton)
 
 def get_user_from_header():
     user_id = request.headers.get('X-User-ID')
@@ -10,4 +14,15 @@ def get_user_from_header():
         user = User.get(User.id == uuid.UUID(user_id))
     except Exception:
         abort(401, 'Invalid User ID')
-    return user
\ No newline at end of file
+    return user
+
+def user_macros_cache_key(user_id) -> str:
+    return f"macros:{getattr(user_id, 'id', user_id)}"
+
+def cached_json_response(key: str, build: Callable[[], Any]) -> Response:
+    """Serve a cached JSON payload with its ETag, answering 304 when the client already has it."""
+    payload = response_cache.get(key, lambda: current_app.json.dumps(build()).encode())
+    response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.headers['Cache-Control'] = 'no-cache' # clients may keep it but must revalidate
+    return response.make_conditional(request)
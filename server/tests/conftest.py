@@ -0,0 +1,32 @@
+import os
+import sys
+
+# the server's modules import as top-level packages (e.g. python -m db.seed)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+import pytest
+from peewee import SqliteDatabase
+from db.models import User, UserSettings, Action, Macro, MacroAction, UserAction, Place
+
+models = [User, UserSettings, Action, Macro, MacroAction, UserAction, Place]
+
+class QueryCountingDatabase(SqliteDatabase):
+    """Records the sql of every query, so tests can assert how many queries a code path issues."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.queries: list[str] = []
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        self.queries.append(sql)
+        return super().execute_sql(sql, params, *args, **kwargs)
+
+@pytest.fixture
+def database():
+    """A fresh in-memory database bound to every model for the duration of a test."""
+    test_db = QueryCountingDatabase(":memory:")
+    with test_db.bind_ctx(models):
+        test_db.create_tables(models)
+        yield test_db
+    test_db.close()
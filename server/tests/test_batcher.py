@@ -0,0 +1,49 @@
+import threading
+import time
+import pytest
+from lib.batcher import Coalescer, MissingBatchResult
+
+def test_lone_lookup_skips_the_window():
+    coalescer = Coalescer("test_lone", lambda group, keys: {key: key.lower() for key in keys}, window=1.0, max_batch=50)
+    started_at = time.monotonic()
+    assert coalescer.submit(None, "AAPL").result(timeout=0.5) == "aapl"
+    assert time.monotonic() - started_at < 0.5
+
+def test_concurrent_lookups_share_a_call():
+    calls = []
+    release = threading.Event()
+
+    def fetch(group, keys):
+        calls.append(keys)
+        release.wait(1)
+        return {key: key.lower() for key in keys}
+
+    coalescer = Coalescer("test_shared", fetch, window=0.05, max_batch=50)
+
+    # a lone lookup is sent right away, the lookups arriving while it is in flight wait for the window
+    first = coalescer.submit(None, "AAPL")
+    while not calls:
+        time.sleep(0.01)
+    rest = [coalescer.submit(None, key) for key in ("MSFT", "GOOG", "MSFT")]
+    release.set()
+
+    assert [future.result(timeout=1) for future in rest] == ["msft", "goog", "msft"]
+    assert first.result(timeout=1) == "aapl"
+    assert calls == [["AAPL"], ["MSFT", "GOOG"]]
+
+def test_bad_key_only_fails_its_own_lookup():
+    def fetch(group, keys):
+        if "BAD" in keys:
+            raise ValueError("invalid ticker")
+        return {key: key.lower() for key in keys if key != "GONE"}
+
+    coalescer = Coalescer("test_split", fetch, window=0.05, max_batch=4)
+    coalescer.in_flight = 1 # as if another batch were being fetched, so these are collected
+    futures = {key: coalescer.submit(None, key) for key in ("AAPL", "BAD", "MSFT", "GONE")}
+
+    assert futures["AAPL"].result(timeout=1) == "aapl"
+    assert futures["MSFT"].result(timeout=1) == "msft"
+    with pytest.raises(ValueError):
+        futures["BAD"].result(timeout=1)
+    with pytest.raises(MissingBatchResult):
+        futures["GONE"].result(timeout=1)
@@ -0,0 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+from db.models import db, pool_stats
+from lib.actions import Actions
+
+def test_actions_on_executor_threads_return_their_connections(monkeypatch):
+    actions = Actions()
+    monkeypatch.setitem(actions.action_registry, "query", lambda self: str(db.execute_sql("SELECT 1").fetchone()[0]))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(lambda _: actions.execute("query", {}), range(8))) == ["1"] * 8
+        # the threads are still alive, nothing may be left checked out on them
+        assert pool_stats()["in_use"] == 0
@@ -0,0 +1,55 @@
+import pytest
+from globals import constants
+from lib.conversations import ConversationStore, Turn
+
+def turn(text: str) -> Turn:
+    return Turn(text=text, actions_performed=[], messages=[{"role": "user", "content": text}, {"role": "assistant", "content": text}])
+
+def tool_round(index: int) -> list:
+    return [
+        {"role": "assistant", "content": [{"type": "tool_use", "id": f"toolu_{index}", "name": "get_weather", "input": {}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": f"toolu_{index}", "content": "sunny " * 200}]},
+    ]
+
+@pytest.fixture
+def new_store(monkeypatch, tmp_path):
+    """Separate stores sharing one sqlite file, like the stores of different worker processes."""
+    monkeypatch.setattr(constants, "conversation_db_path", str(tmp_path / "conversations.db"))
+
+    def create() -> ConversationStore:
+        ConversationStore._instance = None
+        return ConversationStore()
+
+    yield create
+    ConversationStore._instance = None
+
+def test_processes_do_not_overwrite_each_other(new_store):
+    first, second = new_store(), new_store()
+
+    first.append("user", turn("one"))
+    second.append("user", turn("two"))
+    first.append("user", turn("three"))
+
+    expected = ["one", "one", "two", "two", "three", "three"]
+    assert [message["content"] for message in first.history("user")] == expected
+    assert [message["content"] for message in second.history("user")] == expected
+
+    second.clear("user")
+    assert first.history("user") == []
+
+def test_request_compaction_grows_in_steps(new_store, monkeypatch):
+    monkeypatch.setattr(constants, "conversation_token_budget", 100)
+    monkeypatch.setattr(constants, "conversation_compaction_step", 4)
+    store = new_store()
+    messages = [{"role": "user", "content": "weather?"}]
+    requests = []
+
+    for index in range(4):
+        messages = messages + tool_round(index)
+        requests.append(store.fit_request(messages))
+
+    compacted = [[i for i, message in enumerate(request) if message != messages[i]] for request in requests]
+    assert compacted == [[], [2], [2], [2, 4, 6]]
+
+    # the round in between sends the previous request unchanged as its prefix, so the prompt cache still matches
+    assert requests[2][:len(requests[1])] == requests[1]
@@ -0,0 +1,45 @@
+import pytest
+from db.models import Place
+from lib.geocode import Gazetteer
+
+portland_oregon = (45.5234, -122.6762)
+portland_maine = (43.6615, -70.2553)
+paris_france = (48.8534, 2.3488)
+paris_texas = (33.6609, -95.5555)
+
+@pytest.fixture
+def places(database):
+    Place.insert_many([
+        {"key": "portland", "name": "Portland", "country": "US", "lat": portland_oregon[0], "lon": portland_oregon[1], "population": 652503},
+        {"key": "portland", "name": "Portland", "country": "US", "lat": portland_maine[0], "lon": portland_maine[1], "population": 66215},
+        {"key": "paris", "name": "Paris", "country": "FR", "lat": paris_france[0], "lon": paris_france[1], "population": 2138551},
+        {"key": "paris", "name": "Paris", "country": "US", "lat": paris_texas[0], "lon": paris_texas[1], "population": 24782},
+        {"key": "springfield", "name": "Springfield", "country": "US", "lat": 39.8017, "lon": -89.6437, "population": 116250},
+        {"key": "new york city", "name": "New York City", "country": "US", "lat": 40.7143, "lon": -74.006, "population": 8804190},
+    ]).execute()
+
+def test_bare_name_picks_most_populous(places):
+    assert Gazetteer.lookup("Portland") == portland_oregon
+    assert Gazetteer.lookup("Paris") == paris_france
+
+def test_qualified_name_with_unknown_region_falls_through(places):
+    assert Gazetteer.lookup("Portland, Maine") is None
+    assert Gazetteer.lookup("Paris, Texas") is None
+
+def test_qualified_name_with_country_code(places):
+    assert Gazetteer.lookup("Paris, US") == paris_texas
+    assert Gazetteer.lookup("Paris, FR") == paris_france
+    assert Gazetteer.lookup("Springfield, FR") is None
+
+def test_remembered_qualified_name_is_served_locally(places):
+    Gazetteer.remember("Portland, Maine", *portland_maine)
+    assert Gazetteer.lookup("portland maine") == portland_maine
+    assert Gazetteer.lookup("Portland, Maine") == portland_maine
+    assert Gazetteer.lookup("Portland") == portland_oregon
+
+def test_prefix_matches_whole_words_only(places):
+    assert Gazetteer.lookup("New York") == (40.7143, -74.006)
+    assert Gazetteer.lookup("spring") is None
+
+def test_fuzzy_match_for_typos(places):
+    assert Gazetteer.lookup("Pariss") == paris_france
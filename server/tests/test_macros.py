@@ -0,0 +1,38 @@
+import pytest
+from db.models import User, Action, Macro, MacroAction
+from db.utils import get_user_macros
+
+def add_user(macro_count: int, actions_per_macro: int) -> str:
+    user = User.create()
+    actions = [Action.get_or_create(name=f"action_{i}", defaults={"description": f"action {i}"})[0] for i in range(actions_per_macro)]
+    for i in range(macro_count):
+        macro = Macro.create(user=user, name=f"macro {i}", prompt=f"prompt {i}")
+        for action in actions:
+            MacroAction.create(macro=macro, action=action)
+    return str(user.id)
+
+@pytest.mark.parametrize("macro_count, actions_per_macro", [(1, 1), (3, 2), (8, 5)])
+def test_query_count_is_constant(database, macro_count, actions_per_macro):
+    user_id = add_user(macro_count, actions_per_macro)
+    database.queries.clear()
+
+    macros = get_user_macros(user_id)
+
+    assert len(database.queries) == 1
+    assert len(macros) == macro_count
+    assert all(len(macro.required_actions) == actions_per_macro for macro in macros)
+
+def test_macro_without_actions(database):
+    user_id = add_user(2, 0)
+
+    macros = get_user_macros(user_id)
+
+    assert [macro.required_actions for macro in macros] == [[], []]
+
+def test_user_without_macros_and_missing_user(database):
+    user_id = add_user(0, 0)
+    database.queries.clear()
+
+    assert get_user_macros(user_id) == []
+    assert len(database.queries) == 2
+    assert get_user_macros("00000000-0000-0000-0000-000000000000") is None
@@ -0,0 +1,57 @@
+import threading
+import pytest
+from lib import prompts
+from lib.prompts import Prompts
+from db.utils import Macro
+
+def macro(name: str) -> Macro:
+    return Macro(id=name, name=name, prompt=name, allow_other_actions=False, required_actions=[])
+
+@pytest.fixture
+def user_macros(monkeypatch):
+    """Macros per user, served to the prompt compiler instead of the database."""
+    macros: dict[str, list] = {}
+    monkeypatch.setattr(prompts, "get_user_macros", lambda user_id: macros.get(user_id, []))
+    monkeypatch.setattr(Prompts, "_get_system_template", staticmethod(lambda: ("head", "tail")))
+    for cache in (Prompts._user_prompt_cache, Prompts._macro_versions, Prompts._user_prompt_building):
+        cache.clear()
+    yield macros
+    Prompts._user_prompt_cache.clear()
+
+def test_invalidations_do_not_grow_versions(user_macros):
+    for user in range(100):
+        Prompts.get_user_prompt(str(user))
+        Prompts.invalidate_user(str(user))
+        Prompts.invalidate_user(f"never-compiled-{user}")
+
+    assert Prompts._macro_versions == {}
+    assert not Prompts._user_prompt_cache
+
+def test_invalidated_while_compiling_is_not_cached(user_macros, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_macros(user_id):
+        started.set()
+        release.wait(1)
+        return [macro("stale")]
+
+    monkeypatch.setattr(prompts, "get_user_macros", slow_macros)
+    compiler = threading.Thread(target=Prompts.get_user_prompt, args=("user",))
+    compiler.start()
+    started.wait(1)
+    Prompts.invalidate_user("user")
+    monkeypatch.setattr(prompts, "get_user_macros", lambda user_id: [macro("fresh")])
+    release.set()
+    compiler.join(1)
+
+    assert Prompts.get_user_prompt("user").macros == [macro("fresh")]
+    assert Prompts._macro_versions == {}
+
+def test_invalidate_all(user_macros):
+    Prompts.get_user_prompt("one")
+    Prompts.get_user_prompt("two")
+
+    Prompts.invalidate_all()
+
+    assert not Prompts._user_prompt_cache
+    assert Prompts._macro_versions == {}
@@ -0,0 +1,78 @@
+import json
+import time
+import pytest
+from globals import constants
+from lib import recognition
+from lib.recognition import RecognitionSession
+
+class StubRecognizer:
+    """Finalizes an utterance for every chunk starting with b"F", reports speech for b"P" and silence otherwise."""
+
+    def __init__(self) -> None:
+        self.chunk = b""
+
+    def AcceptWaveform(self, frames: bytes) -> bool:
+        self.chunk = frames
+        return frames.startswith(b"F")
+
+    def Result(self) -> str:
+        return json.dumps({"text": "what is the weather"})
+
+    def PartialResult(self) -> str:
+        return json.dumps({"partial": "what" if self.chunk.startswith(b"P") else ""})
+
+    def FinalResult(self) -> str:
+        return json.dumps({"text": ""})
+
+@pytest.fixture
+def session_for(monkeypatch):
+    monkeypatch.setattr(recognition, "create_recognizer", lambda sample_rate: StubRecognizer())
+    monkeypatch.setattr(constants, "recognition_speculative_responses", True)
+    monkeypatch.setattr(constants, "recognition_speculation_silence", 0.05)
+    calls = {"respond": [], "speculate": []}
+
+    def create(speculative_turn="speculated") -> RecognitionSession:
+        def respond(transcript):
+            calls["respond"].append(transcript)
+            return "responded"
+
+        def speculate(transcript):
+            calls["speculate"].append(transcript)
+            return speculative_turn
+
+        return RecognitionSession("user", 16000, respond, speculate)
+
+    create.calls = calls
+    return create
+
+def test_speculates_once_after_silence(session_for):
+    session = session_for()
+
+    assert session.accept(b"F" * 10) == {"final": "what is the weather", "transcript": "what is the weather"}
+    assert session.accept(b"\0" * 10)["partial"] == "" # too soon after speech
+    time.sleep(0.06)
+    session.accept(b"\0" * 10)
+    session.accept(b"\0" * 10)
+
+    assert session.finish() == ("what is the weather", "speculated")
+    assert session_for.calls == {"respond": [], "speculate": ["what is the weather"]}
+
+def test_speech_after_speculating_responds_normally(session_for):
+    session = session_for()
+
+    session.accept(b"F" * 10)
+    time.sleep(0.06)
+    session.accept(b"\0" * 10)
+    session.accept(b"P" * 10)
+    session.accept(b"F" * 10)
+
+    assert session.finish() == ("what is the weather what is the weather", "responded")
+
+def test_speculation_wanting_tools_falls_back(session_for):
+    session = session_for(speculative_turn=None)
+
+    session.accept(b"F" * 10)
+    time.sleep(0.06)
+    session.accept(b"\0" * 10)
+
+    assert session.finish() == ("what is the weather", "responded")
@@ -0,0 +1,46 @@
+import threading
+import pytest
+from lib.response_cache import ResponseCache
+
+@pytest.fixture
+def cache():
+    ResponseCache._instance = None
+    yield ResponseCache()
+    ResponseCache._instance = None
+
+def test_reads_do_not_grow_versions(cache):
+    for user in range(100):
+        cache.get(f"macros:{user}", lambda: b"[]")
+        cache.invalidate(f"macros:{user}")
+        cache.invalidate(f"never-cached:{user}")
+
+    assert cache.versions == {}
+    assert cache.payloads == {}
+
+def test_invalidated_while_building_is_not_cached(cache):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build():
+        started.set()
+        release.wait(1)
+        return b"stale"
+
+    builder = threading.Thread(target=cache.get, args=("macros:1", slow_build))
+    builder.start()
+    started.wait(1)
+    cache.invalidate("macros:1")
+    release.set()
+    builder.join(1)
+
+    assert cache.get("macros:1", lambda: b"fresh").body == b"fresh"
+    assert cache.get("macros:1", lambda: b"rebuilt").body == b"fresh"
+
+def test_invalidate_prefix(cache):
+    cache.get("macros:1", lambda: b"one")
+    cache.get("macros:2", lambda: b"two")
+    cache.get("actions", lambda: b"all")
+
+    cache.invalidate_prefix("macros:")
+
+    assert list(cache.payloads) == ["actions"]
+    assert cache.versions == {}
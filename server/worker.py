@@ -0,0 +1,69 @@
+# python worker.py
+import multiprocessing
+import threading
+import time
+from lib.load import preflight, load_vosk_model
+from globals import constants
+
+def run_job(job, processor, jobs) -> None:
+    """Run the /respond pipeline for a queued recording and store the audio response."""
+    from lib import conversions, tracing
+
+    try:
+        with tracing.span("decode"):
+            pcm, sample_rate = conversions.normalize_audio(job.audio)
+        with tracing.span("transcribe"):
+            transcription = conversions.audio_to_text(pcm, sample_rate)
+        response, actions_performed = processor.handle_message(job.user_id, transcription)
+        audio = b"".join(conversions.text_to_audio(response))
+    except Exception as e:
+        print(f"Job {job.id} failed: {e}")
+        jobs.fail(job.id, str(e))
+        return
+
+    jobs.finish(job.id, transcription, response, audio, conversions.audio_mimetype())
+
+def work(processor, jobs) -> None:
+    from db.models import connection
+
+    while True:
+        job = jobs.claim()
+        if job is None:
+            time.sleep(constants.job_poll_interval)
+            continue
+        # the thread lives as long as the process, its connection goes back to the pool after every job
+        with connection():
+            run_job(job, processor, jobs)
+
+def worker_process() -> None:
+    """Run jobs on a few threads (they mostly wait on upstreams) and periodically recover abandoned jobs."""
+    from lib.jobs import JobQueue
+    from lib.processor import Processor
+    from lib import conversions
+
+    jobs = JobQueue()
+    processor = Processor()
+    conversions.get_model() # before claiming jobs
+
+    for _ in range(constants.job_worker_threads):
+        threading.Thread(target=work, args=(processor, jobs), daemon=True).start()
+
+    while True:
+        jobs.recover()
+        time.sleep(constants.job_recover_interval)
+
+if __name__ == '__main__':
+    preflight()
+    load_vosk_model()
+
+    context = multiprocessing.get_context("spawn")
+    processes: list[multiprocessing.Process] = []
+
+    # keep the configured number of worker processes running
+    while True:
+        processes = [process for process in processes if process.is_alive()]
+        while len(processes) < constants.job_workers:
+            process = context.Process(target=worker_process, daemon=True)
+            process.start()
+            processes.append(process)
+        time.sleep(constants.job_recover_interval)